@@ -2,13 +2,21 @@
 
 import os
 import sys
+if "--import_time" in sys.argv:  # must be installed before other modules are imported
+    from src.startup import install_import_timer
+    install_import_timer()
 import math
 import gzip
 import logging
 import argparse
-from src.main_mss_maker import create_mss
+from src.batch_runner import run_batch, report_batch, validate_batch, report_validation
+from src.row_mapper import RowMapper
 from src.gap_annotator import GapAnnotator
-from src.schema_util import load_json_file, get_remote_schema, get_local_schema
+from src.cli_options import add_gap_arguments, add_output_arguments, add_cache_arguments
+from src.sample_sheet import read_tsv_sheet, read_excel_sheet
+from src.metrics import record_metrics
+from src.progress import open_reporter, report_progress, get_file_size
+# pandas, Biopython, numpy and jsonschema are imported only when they are needed
 # This script is to convert FASTA file to MSS format for GenBank submission
 
 
@@ -16,19 +24,9 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-linkage_evidences = [
-    "pcr", "paired-ends", "align_genus", "align_xgenus", "align_trnscpt", 
-    "within_clone", "clone_contig", "map", "strobe", "proximity_ligation", 
-    "unspecified"
-]
-gap_types = [
-    "auto", "between_scaffolds", "within_scaffold", "telomere", "centromere", "short_arm", 
-    "heterochromatin", "repeat_within_scaffold", "repeat between_scaffolds", "contamination", "unknown"
-]
-
 # parse arguments
 parser = argparse.ArgumentParser(description='Convert FASTA file to MSS format for GenBank submission')
-group1 = parser.add_mutually_exclusive_group(required=True)
+group1 = parser.add_mutually_exclusive_group()
 group1.add_argument('--excel', type=str, help='Excel workbook file')
 group1.add_argument('--tsv', type=str, help='TSV file')
 
@@ -41,44 +39,107 @@ parser.add_argument('-o', '--out_dir', help='Output Directory', default=".")
 #                     help='Submission category (default: draft_genome)', default='draft_genome')
 parser.add_argument('-H', '--hold_date', help='Hold date for the submission, format="yyyymmdd"')
 # parser.add_argument('-r', '--rename_sequence', action="store_true",help='Rename sequence ID. If set, the sequence ID will be renamed as sequence01, sequence02, ... (default: False)')
-parser.add_argument('--linkage_evidence', choices=linkage_evidences, 
-                    help='Linkage evidence for assembly_gap features, e.g. "paired-ends", "proximity ligation". (default: "paired-ends")', default="paired-ends")
-parser.add_argument('--gap_type', choices=gap_types, 
-                    help='Gap types for assembly_gap features, e.g. "within scaffold". (default: auto)', default='auto')
-parser.add_argument('--gap_length', choices=["auto", "known", "unknown"], 
-                    help='Estimated gap length. (default: auto)', default='auto')
-parser.add_argument('--min_gap_length', type=int, 
-                    help='Minimum gap length. (default: 10)', default=10)
-
-
-
-if len(sys.argv) == 1:
-    parser.print_help()
-    sys.exit(1)
-
-args = parser.parse_args()
-
-from Bio import SeqIO
-import pandas as pd
-
-gap_annotator = GapAnnotator.initialize(parser.parse_args())
-
-# load common metadata and schema
-base_json_data = load_json_file(args.metadata_json_file)
-base_schema = get_local_schema()
-
-# load sample list from excel or tsv
-if args.excel:
-    df = pd.read_excel(args.excel, sheet_name=args.sheet, header=[0,1], dtype=str)
-else:
-    df = pd.read_csv(args.tsv, sep="\t", header=[0,1], dtype=str)
-df.fillna("", inplace=True)
-
-
-out_dir = args.out_dir
-for i, row in df.iterrows():
-    ret = create_mss(row, base_json_data, base_schema, out_dir, gap_annotator, hold_date=args.hold_date)
-    # for row in ret:
-    #     print("\t".join(map(str, row)))
-    # print()
-
+add_gap_arguments(parser)
+add_output_arguments(parser)
+parser.add_argument('--shard_size', type=int,
+                    help='Split the output of each sample into shards ({prefix}.partNNN.ann/.fa) whose sequence file is up to this size in MB. '
+                         'A shard index {prefix}.shards.json is also written.')
+parser.add_argument('--shard_records', type=int,
+                    help='Split the output of each sample into shards of up to this number of entries (sequences).')
+parser.add_argument('--metrics', metavar="FILE",
+                    help='Record time, CPU time and peak memory of each stage and counts (records, bases, gaps, bytes) for each row to FILE as JSON lines.')
+parser.add_argument('--progress', metavar="FILE", nargs="?", const="-",
+                    help='Write progress events (rows, records, samples/s, bp/s, ETA) to FILE as JSON lines. Without FILE, they are written to stderr.')
+parser.add_argument('--skip_validation', action="store_true",
+                    help='Do not validate the rows against the JSON schema before processing. (default: False)')
+parser.add_argument('--validate_only', action="store_true",
+                    help='Validate all rows against the JSON schema and exit without reading FASTA files. (default: False)')
+parser.add_argument('--strict', action="store_true",
+                    help='Exit without processing any row if invalid rows are found. By default, invalid rows are reported as failed '
+                         'and the other rows are processed. (default: False)')
+parser.add_argument('--prefetch', type=int,
+                    help='Number of next rows whose FASTA files are read in the background while the current row is processed. '
+                         '0 to disable. Not used with --streaming or -j/--jobs > 1. (default: 0)', default=0)
+parser.add_argument('--prefetch_memory', type=int,
+                    help='Upper limit of the estimated size of the prefetched sequences in MB. (default: 1024)', default=1024)
+add_cache_arguments(parser)
+parser.add_argument('-j', '--jobs', type=int,
+                    help='Number of samples (rows) processed in parallel. (default: 1)', default=1)
+parser.add_argument('--incremental', action="store_true",
+                    help='Skip samples whose inputs (row, metadata, schema, gap options and FASTA file) are unchanged since the last run. '
+                         'Inputs are recorded in mss_manifest.json in the output directory. (default: False)')
+parser.add_argument('--refresh_schema', action="store_true",
+                    help='Download the JSON schema, replace the local schema file and rebuild the schema cache, then exit. '
+                         'The schema is not downloaded otherwise. (default: False)')
+parser.add_argument('--schema_sha256',
+                    help='Expected SHA-256 checksum of the schema downloaded with --refresh_schema.')
+parser.add_argument('--import_time', action="store_true",
+                    help='Report module import times (in the format of "python -X importtime") and startup time to stderr at exit. (default: False)')
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args()
+    if args.refresh_schema:
+        from src.schema_util import refresh_schema
+        try:
+            refresh_schema(expected_sha256=args.schema_sha256)
+        except Exception as err:
+            logger.error(f"Failed to refresh the schema: {err}")
+            sys.exit(1)
+        sys.exit(0)
+    if not (args.excel or args.tsv):
+        parser.error("one of the arguments --excel --tsv is required")
+
+    gap_annotator = GapAnnotator.initialize(parser.parse_args())
+
+    # load sample list from excel or tsv. The TSV file is read without pandas.
+    # the header is compiled once, and rows are passed as plain tuples
+    if args.excel:
+        columns, rows = read_excel_sheet(args.excel, args.sheet)
+    else:
+        columns, rows = read_tsv_sheet(args.tsv)
+    mapper = RowMapper.compile(columns)
+    if args.progress:  # number of rows and total size of the FASTA files for the ETA (the sheet is read once more)
+        reporter = open_reporter(args.progress, truncate=True)
+        num_rows, total_bytes = 0, 0
+        for row in rows:
+            num_rows += 1
+            total_bytes += get_file_size(mapper.file_path(row))
+
+    # common metadata and schema are loaded once per worker process
+    out_dir = args.out_dir
+    worker_kwargs = dict(metadata_json_file=args.metadata_json_file, out_dir=out_dir, mapper=mapper,
+                         gap_annotator=gap_annotator, hold_date=args.hold_date, streaming=args.streaming,
+                         gzip_threads=args.gzip_threads if args.gzip_output else None, metrics=bool(args.metrics),
+                         progress=args.progress, cache_memory=args.cache_memory << 20, cache_dir=args.cache_dir,
+                         shard_bytes=args.shard_size << 20 if args.shard_size else None, shard_records=args.shard_records)
+    if args.import_time:
+        from src.startup import mark_ready
+        mark_ready()
+
+    # all rows are validated before any FASTA file is read. Invalid rows are reported as failed and not processed.
+    invalid = []
+    if not args.skip_validation:
+        num_rows, invalid = validate_batch(enumerate(rows), worker_kwargs)
+        num_invalid = report_validation(invalid, num_rows)
+        if args.validate_only:
+            sys.exit(1 if num_invalid else 0)
+        if num_invalid and args.strict:
+            logger.error("Invalid rows were found. Fix the sample sheet or run without --strict.")
+            sys.exit(1)
+    elif args.validate_only or args.strict:
+        parser.error("--validate_only and --strict cannot be used with --skip_validation")
+
+    results = run_batch(enumerate(rows), worker_kwargs, jobs=args.jobs, incremental=args.incremental,
+                        prefetch=args.prefetch, prefetch_memory=args.prefetch_memory << 20, invalid=invalid)
+    if args.metrics:
+        results = record_metrics(results, args.metrics)
+    if args.progress:
+        results = report_progress(results, reporter, num_rows, total_bytes)
+    num_failed = report_batch(results)
+    if num_failed:
+        sys.exit(1)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+import logging
+import argparse
+from src.gap_annotator import GapAnnotator
+from src.cli_options import add_gap_arguments, add_output_arguments, add_cache_arguments
+from src.server import serve
+# Conversion server for one sample (row) per request. See src/server.py for the request format.
+# Worker processes keep the metadata, schema and imported modules loaded between requests.
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# parse arguments
+parser = argparse.ArgumentParser(description='Server to convert FASTA file to MSS format for GenBank submission')
+parser.add_argument('-m', '--metadata_json_file', required=True, help='Common metadata in JSON format (for submitter and reference)')
+parser.add_argument('-o', '--out_dir', help='Default output directory (can be changed by "out_dir" of each request)', default=".")
+parser.add_argument('-H', '--hold_date', help='Default hold date for the submission, format="yyyymmdd"')
+add_gap_arguments(parser)
+add_output_arguments(parser)
+add_cache_arguments(parser)
+parser.add_argument('-j', '--jobs', type=int,
+                    help='Number of worker processes. (default: 1)', default=1)
+parser.add_argument('--max_pending', type=int,
+                    help='Maximum number of requests accepted at a time. Other requests get "503 busy". (default: 2 * jobs)')
+parser.add_argument('--host', help='Host name or address to listen on. (default: 127.0.0.1)', default="127.0.0.1")
+parser.add_argument('--port', type=int, help='Port number. (default: 8080)', default=8080)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    gap_annotator = GapAnnotator.initialize(args)
+    worker_kwargs = dict(metadata_json_file=args.metadata_json_file, out_dir=args.out_dir, mapper=None,
+                         gap_annotator=gap_annotator, hold_date=args.hold_date, streaming=args.streaming,
+                         gzip_threads=args.gzip_threads if args.gzip_output else None, metrics=True,
+                         cache_memory=args.cache_memory << 20, cache_dir=args.cache_dir)
+    serve(args.host, args.port, worker_kwargs, jobs=args.jobs, max_pending=args.max_pending)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gzip
+import argparse
+
+# Generators of synthetic input data for the benchmark (no network access is needed)
+# - WGS sets: many contigs with a few gaps (draft genomes)
+# - gap-dense scaffolds: sequences with an N run every ~1 kbp
+# - long sequence: one multi-Gbp sequence, written chunk by chunk so that it is never held in memory
+# - complete genome: chromosome and two plasmids (for GNM / MAG rows)
+# - sample sheet: TSV sheet with rows of all four categories (GNM, MAG, WGS, MAG-WGS)
+
+BASES = b"ACGT"
+LINE_WIDTH = 80
+WRITE_CHUNK_SIZE = 1 << 24  # bases generated at once for long sequences
+
+# sizes of the generated data for each preset
+PRESETS = {
+    "quick": {
+        "wgs_contigs": [10, 1000, 10000],
+        "contig_length": 2000,
+        "scaffold_count": 20,
+        "scaffold_length": 1_000_000,
+        "long_length": 50_000_000,
+        "sheet_rows": 1000,
+    },
+    "full": {
+        "wgs_contigs": [10, 10000, 100000, 500000],
+        "contig_length": 2000,
+        "scaffold_count": 100,
+        "scaffold_length": 5_000_000,
+        "long_length": 3_000_000_000,
+        "sheet_rows": 10000,
+    },
+}
+
+SHEET_HEADER = [
+    ["_", "_", "DBLINK", "DBLINK", "DBLINK", "ST_COMMENT", "ST_COMMENT", "ST_COMMENT", "_sequence", "_sequence",
+     "_sequence", "_sequence", "source", "source", "source", "source", "source", "source", "COMMENT"],
+    ["_file_path", "_trad_submission_category", "project", "biosample", "sequence read archive", "Assembly Method",
+     "Genome Coverage", "Sequencing Technology", "seq_prefix", "seq_names", "seq_types", "seq_topologies", "organism",
+     "strain", "isolate", "geo_loc_name", "collection_date", "metagenome_source", "line"],
+]
+CATEGORIES = ["GNM", "MAG", "WGS", "MAG-WGS"]
+
+
+def get_rng(seed):
+    import numpy as np
+    return np.random.default_rng(seed)
+
+
+def random_bases(rng, length):
+    import numpy as np
+    return np.frombuffer(BASES, dtype=np.uint8)[rng.integers(0, 4, length)]
+
+
+def insert_gaps(rng, seq, interval, min_gap=10, max_gap=500):
+    """
+    Replace regions of seq (numpy array) with N runs, about one per interval bases. Returns the number of gaps.
+    """
+    num_gaps = len(seq) // interval
+    if not num_gaps:
+        return 0
+    starts = rng.integers(0, len(seq) - max_gap, num_gaps) if len(seq) > max_gap else []
+    for start, length in zip(starts, rng.integers(min_gap, max_gap, num_gaps)):
+        seq[start:start + length] = ord("N")
+    return num_gaps
+
+
+def write_record(f, seq_id, seq):
+    f.write(f">{seq_id}\n".encode())
+    data = seq.tobytes()
+    f.write(b"\n".join([data[i:i + LINE_WIDTH] for i in range(0, len(data), LINE_WIDTH)]) + b"\n")
+
+
+def open_output(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "wb", compresslevel=1)
+    return open(file_name, "wb")
+
+
+def write_wgs_fasta(file_name, num_contigs, contig_length=2000, gap_interval=20000, seed=0):
+    """
+    Draft genome with num_contigs contigs (length is uniform between 200 and 2 * contig_length).
+    """
+    rng = get_rng(seed)
+    lengths = rng.integers(200, 2 * contig_length, num_contigs)
+    with open_output(file_name) as f:
+        for i, length in enumerate(lengths, 1):
+            seq = random_bases(rng, length)
+            insert_gaps(rng, seq, gap_interval)
+            write_record(f, f"contig{i} synthetic contig", seq)
+
+
+def write_scaffold_fasta(file_name, num_scaffolds, scaffold_length, gap_interval=1000, seed=1):
+    """
+    Scaffolds with an N run (10-500 bp) every gap_interval bases on average.
+    """
+    rng = get_rng(seed)
+    with open_output(file_name) as f:
+        for i in range(1, num_scaffolds + 1):
+            seq = random_bases(rng, scaffold_length)
+            insert_gaps(rng, seq, gap_interval)
+            write_record(f, f"scaffold{i}", seq)
+
+
+def write_long_fasta(file_name, length, gap_interval=1_000_000, seed=2):
+    """
+    One sequence of the given length. Bases are generated and written chunk by chunk.
+    """
+    rng = get_rng(seed)
+    chunk_size = WRITE_CHUNK_SIZE // LINE_WIDTH * LINE_WIDTH
+    with open_output(file_name) as f:
+        f.write(b">chromosome1 synthetic long sequence\n")
+        for start in range(0, length, chunk_size):
+            seq = random_bases(rng, min(chunk_size, length - start))
+            insert_gaps(rng, seq, gap_interval)
+            data = seq.tobytes()
+            f.write(b"\n".join([data[i:i + LINE_WIDTH] for i in range(0, len(data), LINE_WIDTH)]) + b"\n")
+
+
+def write_complete_fasta(file_name, chromosome_length=2_000_000, plasmid_lengths=(50_000, 5_000), seed=3):
+    """
+    Complete genome: a chromosome and plasmids (seq_names = chromosome; pA; pB)
+    """
+    rng = get_rng(seed)
+    with open_output(file_name) as f:
+        for seq_id, length in [("chromosome", chromosome_length), ("pA", plasmid_lengths[0]), ("pB", plasmid_lengths[1])]:
+            seq = random_bases(rng, length)
+            insert_gaps(rng, seq, 100_000)
+            write_record(f, seq_id, seq)
+
+
+def get_sheet_row(i, category, file_path):
+    row = [file_path, category, "PRJDB99999", f"SAMD{i:08d}", f"DRR{i:06d}; DRR{i + 1:06d}", "Skesa v. 1.0", "100x",
+           "Illumina NovaSeq", "", "", "", "", "Bacterium syntheticum", "", "", "Japan: Shizuoka", "2023-04-01", "", f"row {i}; line 2"]
+    if category in ["GNM", "MAG"]:
+        row[9:12] = ["chromosome; pA; pB", "c; p; p", "c; c; l"]
+    else:
+        row[8] = "contig" if i % 2 else ""
+    if category in ["MAG", "MAG-WGS"]:
+        row[14] = f"BIN{i}"
+        row[17] = "soil metagenome"
+    else:
+        row[13] = f"STRAIN-{i}"
+    return row
+
+
+def write_sample_sheet(file_name, num_rows, complete_fasta, draft_fasta):
+    """
+    TSV sample sheet with num_rows rows. Categories are assigned in turn (GNM, MAG, WGS, MAG-WGS).
+    """
+    with open(file_name, "w", encoding="utf-8") as f:
+        for header_row in SHEET_HEADER:
+            f.write("\t".join(header_row) + "\n")
+        for i in range(1, num_rows + 1):
+            category = CATEGORIES[(i - 1) % len(CATEGORIES)]
+            file_path = complete_fasta if category in ["GNM", "MAG"] else draft_fasta
+            f.write("\t".join(get_sheet_row(i, category, file_path)) + "\n")
+
+
+def generate_data(data_dir, preset="quick", force=False):
+    """
+    Generate the data set for the preset into data_dir (existing files are reused unless force is set)
+    and return a dict of the file names.
+    """
+    params = PRESETS[preset]
+    os.makedirs(data_dir, exist_ok=True)
+    files = {"wgs": {}}
+
+    def target(name):
+        file_name = os.path.join(data_dir, name)
+        if force or not os.path.exists(file_name):
+            print(f"Generating {file_name}", file=sys.stderr)
+            return file_name, True
+        return file_name, False
+
+    for num_contigs in params["wgs_contigs"]:
+        file_name, create = target(f"wgs_{num_contigs}_{params['contig_length']}.fa.gz")
+        if create:
+            write_wgs_fasta(file_name, num_contigs, params["contig_length"])
+        files["wgs"][num_contigs] = file_name
+
+    file_name, create = target(f"scaffolds_{params['scaffold_count']}_{params['scaffold_length']}.fa")
+    if create:
+        write_scaffold_fasta(file_name, params["scaffold_count"], params["scaffold_length"])
+    files["scaffolds"] = file_name
+
+    file_name, create = target(f"long_{params['long_length']}.fa")
+    if create:
+        write_long_fasta(file_name, params["long_length"])
+    files["long"] = file_name
+
+    file_name, create = target("complete.fa.gz")
+    if create:
+        write_complete_fasta(file_name)
+    files["complete"] = file_name
+
+    file_name, create = target("draft_small.fa.gz")
+    if create:
+        write_wgs_fasta(file_name, 50, 2000, seed=4)
+    files["draft_small"] = file_name
+
+    file_name, create = target(f"sheet_{params['sheet_rows']}.tsv")
+    if create:
+        write_sample_sheet(file_name, params["sheet_rows"], files["complete"], files["draft_small"])
+    files["sheet"] = file_name
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic FASTA files and sample sheets for the benchmark.')
+    parser.add_argument('-d', '--data_dir', help='Directory for the generated data. (default: benchmark/data)',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    parser.add_argument('-p', '--preset', choices=list(PRESETS), help='Size of the data set. (default: quick)', default="quick")
+    parser.add_argument('-f', '--force', action="store_true", help='Regenerate existing files. (default: False)')
+    args = parser.parse_args()
+    generate_data(args.data_dir, args.preset, args.force)
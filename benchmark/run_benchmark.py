@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import datetime
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+
+# Benchmark of the main steps of MSSmaker on synthetic data (see generate_data.py).
+# Each step is run `repeat` times for wall/CPU time, and once more under tracemalloc for the peak memory
+# (memory-mapped files are not included in the peak). Results are saved as JSON, and can be compared
+# with a previous result with --compare.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from generate_data import generate_data, PRESETS
+from src.schema_util import load_json_file, get_local_schema
+from src.sample_sheet import read_tsv_sheet
+from src.row_mapper import RowMapper
+from src.gap_annotator import GapAnnotator
+from src.json2mss import create_common
+from src.seq_util import read_fasta
+from src.main_mss_maker import row_to_dict, create_mss, output, validate_row, CategoryTemplates
+
+RESULT_VERSION = 1
+COMMON_JSON = os.path.join(os.path.dirname(BENCHMARK_DIR), "example", "common_example.json")
+
+
+def measure(func, repeat=3):
+    """
+    Run func repeat times and return wall/CPU times (seconds), peak memory (bytes) and the value returned by func.
+    """
+    walls, cpus = [], []
+    for _ in range(repeat):
+        gc.collect()
+        wall, cpu = time.perf_counter(), time.process_time()
+        ret = func()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+        del ret
+    gc.collect()
+    tracemalloc.start()
+    ret = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    walls.sort()
+    return {
+        "wall": walls,
+        "wall_min": walls[0],
+        "wall_median": walls[len(walls) // 2],
+        "cpu_min": min(cpus),
+        "peak_memory": peak,
+    }, ret
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_draft_row(mapper, file_path, category="WGS"):
+    """
+    One sheet row (tuple) for the given FASTA file, using the columns of the generated sample sheet.
+    """
+    values = dict.fromkeys(mapper.columns, "")
+    values.update({
+        ("_", "_file_path"): file_path, ("_", "_trad_submission_category"): category,
+        ("DBLINK", "project"): "PRJDB99999", ("DBLINK", "biosample"): "SAMD99999999",
+        ("DBLINK", "sequence read archive"): "DRR999999", ("ST_COMMENT", "Assembly Method"): "Skesa v. 1.0",
+        ("source", "organism"): "Bacterium syntheticum", ("source", "strain"): "BENCH-1",
+        ("_sequence", "seq_prefix"): "contig",
+    })
+    return tuple(values[column] for column in mapper.columns)
+
+
+def get_complete_row(mapper, file_path, seq_names):
+    values = dict(zip(mapper.columns, get_draft_row(mapper, file_path, "GNM")))
+    values[("_sequence", "seq_prefix")] = ""
+    values[("_sequence", "seq_names")] = "; ".join(seq_names)
+    values[("_sequence", "seq_types")] = "; ".join(["c"] * len(seq_names))
+    values[("_sequence", "seq_topologies")] = "; ".join(["l"] * len(seq_names))
+    return tuple(values[column] for column in mapper.columns)
+
+
+def run_benchmarks(files, out_dir, repeat=3, selected=None):
+    """
+    Run the benchmarks and yield (name, parameters, result)
+    """
+    base_json_data = load_json_file(COMMON_JSON)
+    base_schema = get_local_schema()
+    templates = CategoryTemplates(base_json_data, base_schema)  # as the worker context of batch_runner.py
+    gap_annotator = GapAnnotator()
+    columns, rows = read_tsv_sheet(files["sheet"])
+    rows = list(rows)  # read_tsv_sheet streams the rows; they are iterated several times here
+    mapper = RowMapper.compile(columns)
+
+    def bench(name, func, repeat=repeat, **params):
+        if selected and not any(name.startswith(s) for s in selected):
+            return None
+        print(f"Running {name}", file=sys.stderr)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # messages of create_mss
+            result, ret = measure(func, repeat)
+        yield name, params, result
+        return ret
+
+    # sample sheet
+    yield from bench("read_tsv_sheet", lambda: sum(1 for _ in read_tsv_sheet(files["sheet"])[1]), rows=len(rows))  # rows are read lazily
+    yield from bench("row_to_dict", lambda: [row_to_dict(row, base_json_data, base_schema, mapper, templates) for row in rows], rows=len(rows))
+    json_data_list = [row_to_dict(row, base_json_data, base_schema, mapper, templates)[2] for row in rows]
+    yield from bench("create_common", lambda: [create_common(json_data) for json_data in json_data_list], rows=len(rows))
+    yield from bench("validate_row", lambda: [validate_row(row, base_json_data, base_schema, mapper, templates=templates) for row in rows], rows=len(rows))
+
+    # FASTA reading and gap annotation
+    for num_contigs, file_name in files["wgs"].items():
+        yield from bench(f"read_fasta/wgs_{num_contigs}", lambda: read_fasta(file_name),
+                         records=num_contigs, bytes=os.path.getsize(file_name))
+    for data_name in ["scaffolds", "long"]:
+        file_name = files[data_name]
+        seq_records = yield from bench(f"read_fasta/{data_name}", lambda: read_fasta(file_name), bytes=os.path.getsize(file_name))
+        if seq_records is None:
+            seq_records = read_fasta(file_name)
+        total_length = sum(len(seq_record.seq) for seq_record in seq_records)
+        num_gaps = sum(len(gap_annotator.find_gaps(seq_record.seq)) for seq_record in seq_records)
+        yield from bench(f"create_gap_feature/{data_name}",
+                         lambda: [gap_annotator.create_gap_feature(seq_record.seq, seq_record.id) for seq_record in seq_records],
+                         records=len(seq_records), bases=total_length, gaps=num_gaps)
+
+        # writing
+        output_dir = os.path.join(out_dir, "output")
+        yield from bench(f"output/{data_name}", lambda: output(output_dir, data_name, [], seq_records),
+                         records=len(seq_records), bases=total_length)
+        del seq_records
+
+    # end to end
+    largest_wgs = max(files["wgs"])
+    e2e_rows = {
+        f"wgs_{largest_wgs}": get_draft_row(mapper, files["wgs"][largest_wgs]),
+        "scaffolds_mag_wgs": get_draft_row(mapper, files["scaffolds"], "MAG-WGS"),
+        "complete_gnm": get_complete_row(mapper, files["complete"], ["chromosome", "pA", "pB"]),
+        "long_gnm": get_complete_row(mapper, files["long"], ["chromosome1"]),
+    }
+    for data_name, row in e2e_rows.items():
+        for streaming in [False, True]:
+            name = f"create_mss/{data_name}" + ("/streaming" if streaming else "")
+            yield from bench(name, lambda: create_mss(row, base_json_data, base_schema, os.path.join(out_dir, "e2e"),
+                                                      gap_annotator=gap_annotator, streaming=streaming, mapper=mapper,
+                                                      templates=templates),
+                             file=os.path.basename(row[mapper.file_path_index]))
+
+
+def compare_results(previous, current, file=sys.stdout):
+    """
+    Print median wall time and peak memory of the current results relative to the previous ones.
+    """
+    print(f"{'benchmark':<40} {'previous [s]':>12} {'current [s]':>12} {'ratio':>7} {'peak memory ratio':>18}", file=file)
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if not old or "wall_median" not in result or "wall_median" not in old:
+            continue
+        ratio = result["wall_median"] / old["wall_median"] if old["wall_median"] else float("nan")
+        memory_ratio = result["peak_memory"] / old["peak_memory"] if old["peak_memory"] else float("nan")
+        print(f"{name:<40} {old['wall_median']:>12.4f} {result['wall_median']:>12.4f} {ratio:>7.2f} {memory_ratio:>18.2f}", file=file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of MSSmaker with synthetic data.')
+    parser.add_argument('-p', '--preset', choices=list(PRESETS), help='Size of the data set. (default: quick)', default="quick")
+    parser.add_argument('-d', '--data_dir', help='Directory for the generated data. (default: benchmark/data)',
+                        default=os.path.join(BENCHMARK_DIR, "data"))
+    parser.add_argument('-o', '--output', help='Result JSON file. (default: benchmark_{preset}_{revision}.json)')
+    parser.add_argument('-r', '--repeat', type=int, help='Number of timed runs of each benchmark. (default: 3)', default=3)
+    parser.add_argument('-b', '--benchmark', nargs="*", help='Run only the benchmarks whose names start with the given strings.')
+    parser.add_argument('-c', '--compare', help='Previous result JSON file to compare with.')
+    args = parser.parse_args()
+
+    files = generate_data(args.data_dir, args.preset)
+    revision = get_git_revision()
+    out_dir = tempfile.mkdtemp(prefix="mss_benchmark_")
+    try:
+        results = {}
+        for name, params, result in run_benchmarks(files, out_dir, args.repeat, args.benchmark):
+            results[name] = {**params, **result}
+    finally:
+        shutil.rmtree(out_dir)
+
+    data = {
+        "version": RESULT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": revision,
+        "preset": args.preset,
+        "repeat": args.repeat,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output_file = args.output or f"benchmark_{args.preset}_{revision or 'unknown'}.json"
+    with open(output_file, "w") as f:
+        json.dump(data, f, indent=1)
+    print(f"Results were saved to {output_file}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), data)
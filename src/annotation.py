@@ -0,0 +1,114 @@
+from collections.abc import Sequence
+
+# Compact storage of annotation rows.
+# An MSS annotation row is 5 columns (entry, feature, location, qualifier key, qualifier value).
+# assembly_gap features, which can be millions for fragmented assemblies, are not stored as rows:
+# GapFeatures keeps only the entry name, the gap runs of the sequence scan (shared, not copied) and the GapAnnotator,
+# whose constant qualifiers (estimated_length, gap_type, linkage_evidence) are formatted once per entry.
+# The rows (or their text) are produced when the file is written.
+# AnnotationBuffer holds lists of plain rows (COMMON, source features) and GapFeatures blocks in order.
+
+
+class GapFeatures(Sequence):
+    """
+    assembly_gap features of one sequence. Behaves as a read-only list of rows (3 rows per gap).
+    """
+    __slots__ = ("seq_name", "runs", "annotator")
+
+    def __init__(self, seq_name, runs, annotator):
+        self.seq_name = seq_name or ""
+        self.runs = runs  # (start, end), 0-based and end exclusive
+        self.annotator = annotator
+
+    def __len__(self):
+        return len(self.runs) * 3
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("annotation row index out of range")
+        gap, kind = divmod(index, 3)
+        if kind == 0:
+            start, end = self.runs[gap]
+            entry = self.seq_name if gap == 0 else ""
+            # +1 because INSDC coordinate is 1-based
+            return [entry, "assembly_gap", f"{start + 1}..{end}", "estimated_length", self.annotator.gap_length]
+        elif kind == 1:
+            return ["", "", "", "gap_type", self.annotator.gap_type]
+        else:
+            return ["", "", "", "linkage_evidence", self.annotator.linkage_evidence]
+
+    def iter_text(self, batch):
+        """
+        Yield the tab-separated lines of up to batch rows at a time
+        """
+        annotator = self.annotator
+        qualifiers = (f"\testimated_length\t{annotator.gap_length}\n\t\t\tgap_type\t{annotator.gap_type}\n"
+                      f"\t\t\tlinkage_evidence\t{annotator.linkage_evidence}\n")
+        runs = self.runs
+        step = max(batch // 3, 1)
+        for i in range(0, len(runs), step):
+            lines = [f"\tassembly_gap\t{start + 1}..{end}{qualifiers}" for start, end in runs[i:i + step]]
+            if i == 0:
+                lines[0] = self.seq_name + lines[0]
+            yield "".join(lines)
+
+
+class AnnotationBuffer:
+    """
+    Annotation rows of a file, kept as blocks of plain rows and GapFeatures. Supports append, += and iteration like a list.
+    """
+    __slots__ = ("blocks", "rows")
+
+    def __init__(self, rows=None):
+        self.blocks = []
+        self.rows = None  # last block of plain rows, to which rows are appended
+        if rows:
+            self.extend(rows)
+
+    def append(self, row):
+        if self.rows is None:
+            self.rows = []
+            self.blocks.append(self.rows)
+        self.rows.append(row)
+
+    def extend(self, annot):
+        if isinstance(annot, AnnotationBuffer):
+            for block in annot.blocks:
+                self.extend(block)
+        elif isinstance(annot, GapFeatures):
+            if annot:
+                self.blocks.append(annot)
+                self.rows = None
+        else:
+            for row in annot:
+                self.append(row)
+
+    def __iadd__(self, annot):
+        self.extend(annot)
+        return self
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def iter_text(self, batch):
+        for block in self.blocks:
+            yield from iter_annotation_text(block, batch)
+
+
+def iter_annotation_text(annot, batch):
+    """
+    Yield the tab-separated lines of the annotation rows (list of rows, GapFeatures or AnnotationBuffer), batch rows at a time
+    """
+    if isinstance(annot, (GapFeatures, AnnotationBuffer)):
+        yield from annot.iter_text(batch)
+        return
+    for i in range(0, len(annot), batch):
+        yield "".join(["\t".join(map(str, row)) + "\n" for row in annot[i:i + batch]])
@@ -0,0 +1,291 @@
+import io
+import os
+import logging
+import contextlib
+from collections import deque
+from functools import partial
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from .main_mss_maker import create_mss, row_to_dict, get_output_prefix, validate_row, CategoryTemplates
+from .schema_util import load_json_file, get_local_schema
+from .manifest import Manifest
+from .metrics import RowMetrics
+from .progress import open_reporter
+from .prefetch import iter_prefetched, PREFETCH_MEMORY
+from .record_cache import RecordCache
+from .seq_util import read_fasta
+
+logger = logging.getLogger(__name__)
+
+# per-process state. Filled once by init_worker, then shared by all rows processed in the process.
+_worker_context = {}
+
+TASKS_PER_JOB = 4  # rows submitted to the process pool ahead of the results, per job
+
+
+@dataclass
+class RowResult:
+    index: int
+    file_path: str
+    error: str|None = None
+    log: str = ""
+    outputs: list[str]|None = None
+    skipped: bool = False
+    metrics: dict|None = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def init_worker(metadata_json_file, out_dir, mapper, gap_annotator=None, hold_date=None, streaming=False, gzip_threads=None,
+                metrics=False, progress=None, cache_memory=0, cache_dir=None, shard_bytes=None, shard_records=None):
+    """
+    Load common metadata and schema once per process.
+    """
+    _worker_context["base_json_data"] = load_json_file(metadata_json_file)
+    _worker_context["base_schema"] = get_local_schema()
+    # category templates and validators of this base data, created on first use
+    _worker_context["templates"] = CategoryTemplates(_worker_context["base_json_data"], _worker_context["base_schema"])
+    _worker_context["out_dir"] = out_dir
+    _worker_context["mapper"] = mapper
+    _worker_context["gap_annotator"] = gap_annotator
+    _worker_context["hold_date"] = hold_date
+    _worker_context["streaming"] = streaming
+    _worker_context["gzip_threads"] = gzip_threads
+    _worker_context["metrics"] = metrics
+    _worker_context["progress"] = open_reporter(progress) if progress else None
+    _worker_context["shard_bytes"] = shard_bytes
+    _worker_context["shard_records"] = shard_records
+    # records of FASTA files referred to by several rows are shared within a process
+    if cache_memory and not _worker_context.get("record_cache"):
+        _worker_context["record_cache"] = RecordCache(cache_memory, cache_dir)
+    elif not cache_memory:
+        _worker_context["record_cache"] = None
+
+
+def process_row(index, row, prefetched=None, mapper=None, out_dir=None, hold_date=None):
+    """
+    Run create_mss for one row. Printed messages are captured and returned so that the main process
+    can output them in the row order. Exceptions are caught and returned as an error message.
+    If metrics are enabled, per-stage metrics of the row are returned as well.
+    If progress reporting is enabled, row_start, record and row_end events are written from this process.
+    prefetched is a future of the records read in the background. If reading failed, the file is read again
+    by create_mss so that the error is reported in the same way.
+    mapper, out_dir and hold_date override those given to init_worker (used by the server, see server.py).
+    """
+    ctx = _worker_context
+    mapper = mapper or ctx["mapper"]
+    out_dir = out_dir or ctx["out_dir"]
+    hold_date = hold_date or ctx["hold_date"]
+    file_path = mapper.file_path(row)
+    buf = io.StringIO()
+    error, outputs = None, None
+    metrics = RowMetrics() if ctx["metrics"] else None
+    progress = ctx["progress"].row(index, file_path) if ctx["progress"] else None
+    with contextlib.redirect_stdout(buf):
+        if metrics:
+            metrics.start()
+        preloaded_records = None
+        if prefetched is not None:
+            try:
+                with metrics.stage("prefetch_wait") if metrics else contextlib.nullcontext():
+                    preloaded_records = prefetched.result()
+            except Exception:
+                pass
+        try:
+            outputs = create_mss(row, ctx["base_json_data"], ctx["base_schema"], out_dir, ctx["gap_annotator"],
+                                 hold_date=hold_date, streaming=ctx["streaming"], mapper=mapper,
+                                 gzip_threads=ctx["gzip_threads"], metrics=metrics, progress=progress,
+                                 preloaded_records=preloaded_records, record_cache=ctx["record_cache"],
+                                 shard_bytes=ctx["shard_bytes"], shard_records=ctx["shard_records"],
+                                 templates=ctx["templates"])
+        except Exception as err:
+            error = f"{type(err).__name__}: {err}"
+        finally:
+            if metrics:
+                metrics.finish()
+            if progress:
+                progress.finish("failed" if error else "succeeded")
+    return RowResult(index, file_path, error, buf.getvalue(), outputs, metrics=metrics.to_dict() if metrics else None)
+
+
+def validate_batch(rows, worker_kwargs):
+    """
+    Validate all (index, row) pairs before any FASTA file is read, and return the number of rows and
+    the list of (index, file path, errors) for the invalid rows. Validators are compiled once per category and reused for all rows.
+    The invalid rows are passed to run_batch, which reports them as failed without processing them.
+    """
+    init_worker(**worker_kwargs)
+    ctx = _worker_context
+    mapper = ctx["mapper"]
+    invalid = []
+    num_rows = 0
+    for index, row in rows:
+        num_rows += 1
+        try:
+            errors = validate_row(row, ctx["base_json_data"], ctx["base_schema"], mapper, templates=ctx["templates"])
+        except Exception as err:
+            errors = [f"{type(err).__name__}: {err}"]
+        if errors:
+            invalid.append((index, mapper.file_path(row), errors))
+    return num_rows, invalid
+
+
+def report_validation(invalid, num_rows):
+    """
+    Print all errors of the invalid rows and a summary. Returns the number of invalid rows.
+    """
+    for index, file_path, errors in invalid:
+        print(f"Row {index} ({file_path}): {len(errors)} validation error(s)")
+        for error in errors:
+            print(f"  {error}")
+    print(f"Validation: {num_rows - len(invalid)} valid, {len(invalid)} invalid")
+    return len(invalid)
+
+
+def check_manifest(rows, manifest):
+    """
+    Yield (index, row, state) where state is (prefix, row hash, FASTA file info, up to date) or None if it cannot be checked.
+    Requires init_worker to be called in the current process.
+    """
+    ctx = _worker_context
+    mapper = ctx["mapper"]
+    for index, row in rows:
+        try:
+            file_path, _, json_data, _, dict_source, _ = row_to_dict(row, ctx["base_json_data"], ctx["base_schema"], mapper, ctx["templates"])
+            prefix = get_output_prefix(json_data, dict_source)
+            row_hash = manifest.row_hash(mapper.columns, row)
+            up_to_date, file_info = manifest.is_up_to_date(prefix, row_hash, file_path)
+            yield index, row, (prefix, row_hash, file_info, up_to_date)
+        except Exception:  # the error will be reported when the row is processed
+            yield index, row, None
+
+
+def _skipped_result(index, row, prefix):
+    file_path = _worker_context["mapper"].file_path(row)
+    return RowResult(index, file_path, log=f"Skipping {file_path}: {prefix} is up to date\n", skipped=True)
+
+
+def _update_manifest(manifest, state, result):
+    if manifest is not None and state and result.ok:
+        prefix, row_hash, file_info, _ = state
+        outputs = [os.path.basename(output_file) for output_file in result.outputs]
+        manifest.update(prefix, row_hash, result.file_path, file_info, outputs)
+
+
+def run_batch(rows, worker_kwargs, jobs=1, incremental=False, prefetch=0, prefetch_memory=PREFETCH_MEMORY, invalid=()):
+    """
+    Process (index, row) pairs serially (jobs=1) or with a process pool. row is a tuple of cell values.
+    worker_kwargs are the arguments of init_worker.
+    In incremental mode, rows whose inputs are unchanged since the last run are skipped (see manifest.py).
+    In serial mode, FASTA files of up to `prefetch` next rows are read in the background (see prefetch.py),
+    except in streaming mode.
+    Rows found invalid by validate_batch (list of (index, file path, errors)) are not processed, and yielded as failed results.
+    Results are yielded in the row order, so the output is the same regardless of the number of jobs.
+    """
+    if jobs <= 1 or incremental:
+        init_worker(**worker_kwargs)
+    invalid_indexes = {index for index, _, _ in invalid}
+    if incremental:
+        ctx = _worker_context
+        manifest = Manifest(ctx["out_dir"], ctx["base_json_data"], ctx["base_schema"], ctx["gap_annotator"], ctx["hold_date"],
+                            output_options={"gzip": bool(ctx["gzip_threads"]), "shard_bytes": ctx["shard_bytes"],
+                                            "shard_records": ctx["shard_records"]})
+        try:
+            # invalid rows are checked too, so that their previous outputs are not reported as stale
+            items = (item for item in check_manifest(rows, manifest) if item[0] not in invalid_indexes)
+            yield from _merge_invalid(_run_batch(items, worker_kwargs, jobs, manifest, prefetch, prefetch_memory), invalid)
+            manifest.report_stale()
+        finally:
+            manifest.save()
+    else:
+        items = ((index, row, None) for index, row in rows if index not in invalid_indexes)
+        yield from _merge_invalid(_run_batch(items, worker_kwargs, jobs, None, prefetch, prefetch_memory), invalid)
+
+
+def _merge_invalid(results, invalid):
+    """
+    Insert failed results of the invalid rows into the results of the other rows, in the row order
+    """
+    invalid = deque(sorted(invalid, key=lambda item: item[0]))
+    for result in results:
+        while invalid and invalid[0][0] < result.index:
+            yield _invalid_result(*invalid.popleft())
+        yield result
+    while invalid:
+        yield _invalid_result(*invalid.popleft())
+
+
+def _invalid_result(index, file_path, errors):
+    return RowResult(index, file_path, f"Validation failed: {'; '.join(errors)}")
+
+
+def _run_batch(rows, worker_kwargs, jobs, manifest=None, prefetch=0, prefetch_memory=PREFETCH_MEMORY):
+    if jobs <= 1:
+        if prefetch and not worker_kwargs.get("streaming"):
+            mapper = worker_kwargs["mapper"]
+
+            def get_file_path(item):
+                index, row, state = item
+                return None if state and state[3] else mapper.file_path(row)  # up-to-date rows are not read
+            record_cache = _worker_context["record_cache"]
+            loader = record_cache.read_fasta if record_cache else read_fasta
+            rows = iter_prefetched(rows, get_file_path, prefetch, prefetch_memory, loader)
+        else:
+            rows = ((item, None) for item in rows)
+        for (index, row, state), prefetched in rows:
+            if state and state[3]:
+                yield _skipped_result(index, row, state[0])
+                continue
+            result = process_row(index, row, prefetched)
+            del prefetched
+            _update_manifest(manifest, state, result)
+            yield result
+    else:
+        mapper = worker_kwargs["mapper"]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=partial(init_worker, **worker_kwargs)) as executor:
+            # rows are submitted as results are collected, so that the sheet is not read into memory at once
+            tasks = deque()
+            for index, row, state in rows:
+                future = None if state and state[3] else executor.submit(process_row, index, row)
+                tasks.append((index, row, state, future))
+                if len(tasks) >= jobs * TASKS_PER_JOB:
+                    yield _collect_result(*tasks.popleft(), mapper, manifest)
+            while tasks:
+                yield _collect_result(*tasks.popleft(), mapper, manifest)
+
+
+def _collect_result(index, row, state, future, mapper, manifest):
+    if future is None:
+        return _skipped_result(index, row, state[0])
+    try:
+        result = future.result()
+    except Exception as err:  # e.g. worker process killed
+        result = RowResult(index, mapper.file_path(row), f"{type(err).__name__}: {err}")
+    _update_manifest(manifest, state, result)
+    return result
+
+
+def report_batch(results):
+    """
+    Print captured messages and per-row errors, then a summary of succeeded/failed rows.
+    Returns the number of failed rows. Only the failed results are kept until the end.
+    """
+    num_succeeded, num_skipped, failed = 0, 0, []
+    for result in results:
+        print(result.log, end="")
+        if result.skipped:
+            num_skipped += 1
+        elif result.ok:
+            num_succeeded += 1
+        else:
+            logger.error(f"Row {result.index} ({result.file_path}) failed: {result.error}")
+            failed.append(result)
+    if num_skipped:
+        print(f"Finished: {num_succeeded} succeeded, {len(failed)} failed, {num_skipped} skipped (up to date)")
+    else:
+        print(f"Finished: {num_succeeded} succeeded, {len(failed)} failed")
+    for result in failed:
+        print(f"  FAILED row {result.index}: {result.file_path} ({result.error})")
+    return len(failed)
@@ -0,0 +1,51 @@
+# Command line options shared by MSSmaker.py and MSSserver.py.
+# The gap options are converted to GapAnnotator by GapAnnotator.initialize(args).
+
+
+linkage_evidences = [
+    "pcr", "paired-ends", "align_genus", "align_xgenus", "align_trnscpt",
+    "within_clone", "clone_contig", "map", "strobe", "proximity_ligation",
+    "unspecified"
+]
+gap_types = [
+    "auto", "between_scaffolds", "within_scaffold", "telomere", "centromere", "short_arm",
+    "heterochromatin", "repeat_within_scaffold", "repeat between_scaffolds", "contamination", "unknown"
+]
+
+
+def add_gap_arguments(parser):
+    """
+    Options of assembly_gap features (--linkage_evidence, --gap_type, --gap_length, --min_gap_length)
+    """
+    parser.add_argument('--linkage_evidence', choices=linkage_evidences,
+                        help='Linkage evidence for assembly_gap features, e.g. "paired-ends", "proximity ligation". (default: "paired-ends")', default="paired-ends")
+    parser.add_argument('--gap_type', choices=gap_types,
+                        help='Gap types for assembly_gap features, e.g. "within scaffold". (default: auto)', default='auto')
+    parser.add_argument('--gap_length', choices=["auto", "known", "unknown"],
+                        help='Estimated gap length. (default: auto)', default='auto')
+    parser.add_argument('--min_gap_length', type=int,
+                        help='Minimum gap length. (default: 10)', default=10)
+
+
+def add_output_arguments(parser):
+    """
+    Options of reading and writing each sample (--streaming, --gzip_output, --gzip_threads)
+    """
+    parser.add_argument('--streaming', action="store_true",
+                        help='Read, annotate and write sequences one by one to keep memory usage low for large assemblies. '
+                             'Compressed FASTA files of WGS/MAG-WGS rows with seq_prefix are read twice, to count the sequences first. (default: False)')
+    parser.add_argument('--gzip_output', action="store_true",
+                        help='Write gzip-compressed output files ({prefix}.ann.gz and {prefix}.fa.gz). (default: False)')
+    parser.add_argument('--gzip_threads', type=int,
+                        help='Number of threads used to compress each output file with --gzip_output. (default: 4)', default=4)
+
+
+def add_cache_arguments(parser):
+    """
+    Options of the record cache (--cache_memory, --cache_dir), see record_cache.py
+    """
+    parser.add_argument('--cache_memory', type=int,
+                        help='Keep parsed FASTA records and gap scan results of up to this size (MB) in memory of each worker process, '
+                             'for rows referring to the same FASTA file. 0 to disable. (default: 0)', default=0)
+    parser.add_argument('--cache_dir',
+                        help='Directory to save cache entries evicted from memory (used with --cache_memory).')
@@ -0,0 +1,241 @@
+import io
+import gzip
+import lzma
+import bz2
+import zlib
+import queue
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Input layer for (compressed) FASTA files, and parallel gzip compression of the output files.
+# The compression format is detected from the magic bytes, not from the file extension.
+# Decompression runs on a background thread and the parser reads the decompressed data in binary mode,
+# so that inflating the next part of the file overlaps with parsing and gap scanning.
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+BZ2_MAGIC = b"BZh"
+
+READ_SIZE = 1 << 20  # 1 MB
+QUEUE_SIZE = 16  # max number of decompressed chunks waiting for the parser
+BGZF_BATCH = 64  # number of BGZF blocks (up to 64 KB each) decompressed in parallel
+BGZF_THREADS = 4
+
+
+def detect_compression(file_name):
+    """
+    Return "bgzf", "gzip", "xz", "zstd", "bz2" or None (uncompressed)
+    """
+    with open(file_name, "rb") as f:
+        head = f.read(18)
+    if head.startswith(GZIP_MAGIC):
+        # BGZF: gzip block with the FEXTRA flag and a "BC" subfield
+        if len(head) >= 18 and head[3] & 4 and head[12:14] == b"BC":
+            return "bgzf"
+        return "gzip"
+    if head.startswith(XZ_MAGIC):
+        return "xz"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(BZ2_MAGIC):
+        return "bz2"
+    return None
+
+
+def _iter_file_chunks(handle):
+    with handle:
+        while chunk := handle.read(READ_SIZE):
+            yield chunk
+
+
+def _iter_bgzf_blocks(f):
+    """
+    Yield the raw deflate data of each BGZF block.
+    """
+    while header := f.read(12):
+        if len(header) < 12 or header[:2] != GZIP_MAGIC:
+            raise ValueError("Invalid BGZF block")
+        xlen = struct.unpack("<H", header[10:12])[0]
+        extra = f.read(xlen)
+        bsize = None
+        pos = 0
+        while pos < xlen:
+            si1, si2, slen = extra[pos], extra[pos + 1], struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+            if si1 == 66 and si2 == 67:  # "BC"
+                bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0]
+            pos += 4 + slen
+        if bsize is None:
+            raise ValueError("Invalid BGZF block (BSIZE not found)")
+        data = f.read(bsize - xlen - 19)
+        f.read(8)  # CRC32 and ISIZE
+        yield data
+
+
+def _inflate(data):
+    return zlib.decompress(data, -15)  # zlib releases the GIL, so blocks are inflated in parallel
+
+
+def _iter_bgzf_chunks(file_name, threads=BGZF_THREADS):
+    with open(file_name, "rb") as f, ThreadPoolExecutor(max_workers=threads) as executor:
+        blocks = _iter_bgzf_blocks(f)
+        while batch := [data for _, data in zip(range(BGZF_BATCH), blocks)]:
+            yield b"".join(executor.map(_inflate, batch))
+
+
+def _open_zstd(file_name):
+    try:
+        import zstandard
+    except ImportError:
+        try:
+            from compression import zstd  # Python 3.14+
+        except ImportError:
+            raise ImportError("zstandard module is required to read .zst files (pip install zstandard)")
+        return zstd.open(file_name, "rb")
+    return zstandard.ZstdDecompressor().stream_reader(open(file_name, "rb"), read_across_frames=True, closefd=True)
+
+
+def iter_decompressed_chunks(file_name):
+    compression = detect_compression(file_name)
+    if compression == "bgzf":
+        return _iter_bgzf_chunks(file_name)
+    elif compression == "gzip":
+        return _iter_file_chunks(gzip.open(file_name, "rb"))
+    elif compression == "xz":
+        return _iter_file_chunks(lzma.open(file_name, "rb"))
+    elif compression == "zstd":
+        return _iter_file_chunks(_open_zstd(file_name))
+    elif compression == "bz2":
+        return _iter_file_chunks(bz2.open(file_name, "rb"))
+    else:
+        return _iter_file_chunks(open(file_name, "rb"))
+
+
+class ThreadedReader(io.RawIOBase):
+    """
+    Binary file-like object fed with chunks produced on a background thread.
+    """
+
+    def __init__(self, chunks, queue_size=QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buffer = b""
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(chunks,), daemon=True)
+        self._thread.start()
+
+    def _produce(self, chunks):
+        try:
+            for chunk in chunks:
+                if self._stop.is_set():
+                    break
+                self._queue.put(chunk)
+            self._queue.put(None)
+        except BaseException as err:
+            self._queue.put(err)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            else:
+                self._buffer = memoryview(item)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]  # memoryview, no copy
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            while self._thread.is_alive():  # unblock the producer waiting on a full queue
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        super().close()
+
+
+def open_input(file_name):
+    """
+    Open a (compressed) input file for reading in binary mode.
+    Decompression is done on a background thread.
+    """
+    return io.BufferedReader(ThreadedReader(iter_decompressed_chunks(file_name)), buffer_size=READ_SIZE)
+
+
+GZIP_BLOCK_SIZE = 1 << 20  # 1 MB of uncompressed data per gzip member
+GZIP_LEVEL = 6
+
+
+def _compress_gzip_member(data, level=GZIP_LEVEL):
+    return zlib.compress(data, level, wbits=31)  # wbits=31: gzip format. zlib releases the GIL.
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Binary file-like object writing gzip-compressed data.
+    Data is split into blocks that are compressed on a thread pool as independent gzip members,
+    and the members are written in order as soon as they are ready (like pigz). The concatenated
+    members form a valid gzip file. Memory usage is bounded by the number of blocks in flight.
+    """
+
+    def __init__(self, file_name, threads=4, block_size=GZIP_BLOCK_SIZE, level=GZIP_LEVEL):
+        self._file = open(file_name, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._pending = []  # futures of compressed members, in the order of the data
+        self._max_pending = threads * 2
+        self._block = bytearray()
+        self._block_size = block_size
+        self._level = level
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = memoryview(b).cast("B")
+        self._block += data
+        while len(self._block) >= self._block_size:
+            self._submit(bytes(self._block[:self._block_size]))
+            del self._block[:self._block_size]
+        return len(data)
+
+    def _submit(self, data):
+        self._pending.append(self._executor.submit(_compress_gzip_member, data, self._level))
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.pop(0).result())
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self._block or not self._pending:  # an empty file still gets one (empty) member
+                    self._submit(bytes(self._block))
+                    self._block = bytearray()
+                for future in self._pending:
+                    self._file.write(future.result())
+                self._pending = []
+            finally:
+                self._executor.shutdown()
+                self._file.close()
+        super().close()
+
+
+def open_gzip_output(file_name, mode="wb", threads=4):
+    """
+    Open a gzip output compressed in parallel. mode is "wb" or "w" (text).
+    """
+    raw = ParallelGzipWriter(file_name, threads=threads)
+    if mode == "w":
+        return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=GZIP_BLOCK_SIZE))
+    return raw
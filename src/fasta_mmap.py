@@ -0,0 +1,112 @@
+import mmap
+import os
+from dataclasses import dataclass
+from .compressed_io import detect_compression
+
+# Reader for uncompressed FASTA files using mmap.
+# Only the record offsets are kept in memory. Sequences are read from the mapped file
+# chunk by chunk when they are scanned or written, so the whole sequence never goes to the heap.
+
+WHITESPACE = b" \t\r\n"  # removed from sequences, same as Bio.SeqIO
+# Bio.SeqIO ("fasta" format) raises ValueError if a non-empty file does not start with a header line
+NO_HEADER_ERROR = ("This FASTA file contains comments at the beginning of the file, "
+                   "which are not allowed by the 'fasta' parser.")
+CHUNK_SIZE = 1 << 22  # 4 MB of the raw file per chunk
+
+
+class MappedSequence:
+    """
+    Sequence region (including line breaks) of a record in a memory-mapped FASTA file.
+    """
+
+    def __init__(self, buf, start, end):
+        self._buf = buf  # memoryview of the mmap object
+        self.start = start
+        self.end = end
+        self._length = None
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Yield the sequence as bytes chunks with line breaks and spaces removed.
+        """
+        for offset in range(self.start, self.end, chunk_size):
+            chunk = self._buf[offset:min(offset + chunk_size, self.end)].tobytes().translate(None, WHITESPACE)
+            if chunk:
+                yield chunk
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(len(chunk) for chunk in self.iter_chunks())
+        return self._length
+
+    def __bytes__(self):
+        return b"".join(self.iter_chunks())
+
+    def __str__(self):
+        return bytes(self).decode()
+
+
+@dataclass
+class MappedRecord:
+    """
+    Minimal substitute of Bio.SeqRecord for memory-mapped sequences
+    """
+    id: str
+    seq: MappedSequence
+    name: str = ""
+    description: str = ""
+
+
+def index_fasta(buf):
+    """
+    Return the list of (title, sequence start, sequence end) found in the buffer.
+    Raises ValueError if there is text before the first header line, as in Bio.SeqIO.
+    """
+    index = []
+    size = len(buf)
+    if not size:
+        return index
+    if buf[:1] != b">":
+        raise ValueError(NO_HEADER_ERROR)
+    pos = 0
+    while True:
+        header_end = buf.find(b"\n", pos)
+        if header_end < 0:
+            header_end = size
+        next_pos = buf.find(b"\n>", header_end)
+        seq_end = size if next_pos < 0 else next_pos + 1
+        title = buf[pos + 1:header_end].decode().rstrip()
+        index.append((title, min(header_end + 1, size), seq_end))
+        if next_pos < 0:
+            break
+        pos = next_pos + 1
+    return index
+
+
+def is_mappable(file_name):
+    """
+    Plain (uncompressed) and non-empty files can be memory-mapped.
+    """
+    if not os.path.isfile(file_name) or os.path.getsize(file_name) == 0:
+        return False
+    return detect_compression(file_name) is None
+
+
+def read_mapped_fasta(file_name):
+    """
+    Map the FASTA file and return a list of MappedRecord.
+    """
+    with open(file_name, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        index = index_fasta(mm)
+    except ValueError:
+        mm.close()
+        raise
+    buf = memoryview(mm)
+    records = []
+    for title, start, end in index:
+        words = title.split(None, 1)
+        seq_id = words[0] if words else ""
+        records.append(MappedRecord(seq_id, MappedSequence(buf, start, end), name=seq_id, description=title))
+    return records
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-import re
+from .seq_scan import scan_sequence, SeqScan
+from .annotation import GapFeatures
 
 # constant values for assembly_gap feature
 # see https://www.ncbi.nlm.nih.gov/assembly/agp/AGP_Specification/
@@ -13,8 +14,6 @@ class GapAnnotator:
     gap_type: str = "within scaffolds"
     gap_length:str = "known"
 
-    gap_pattern: re.Pattern|None = None # re.compile('n{%d,}' % min_gap_length)
-
 
     @staticmethod
     def initialize(args):
@@ -45,26 +44,31 @@ class GapAnnotator:
                 raise AssertionError("Please specify gap_length")
         else:
             gap_length = args.gap_length # known or unknown  
-        
-        gap_pattern = re.compile('n{%d,}' % min_gap_length)
 
-        return GapAnnotator(min_gap_length, linkage_evidence, gap_type, gap_length, gap_pattern)
+        return GapAnnotator(min_gap_length, linkage_evidence, gap_type, gap_length)
 
     
-    def create_gap_feature(self, seq, seq_name=None):
-        ret = []
-        # length_value = "known" if gap_length else "unknown"
+    def scan(self, seq) -> SeqScan:
+        """
+        Scan the sequence once for gaps (N runs of min_gap_length or longer), illegal characters and base counts.
+        seq can be Bio.Seq, str, bytes-like or MappedSequence. See seq_scan.py
+        """
+        return scan_sequence(seq, self.min_gap_length)
+
+    def find_gaps(self, seq):
+        """
+        Return the list of gap regions as (start, end), 0-based and end exclusive.
+        """
+        return self.scan(seq).n_runs
 
-        for match in self.gap_pattern.finditer(seq.lower()):
-            start = match.start() + 1  # +1 because INSDC coordinate is 1-based
-            end = match.end()
-            location = f"{start}..{end}"
-            ret.append(["", "assembly_gap", location, "estimated_length", self.gap_length])
-            ret.append(["", "", "", "gap_type", self.gap_type])
-            ret.append(["", "", "", "linkage_evidence", self.linkage_evidence])
-        if ret and seq_name:  # For draft genome, (souce feature is described in COMMON)
-            ret[0][0] = seq_name
-        return ret
+    def create_gap_feature(self, seq, seq_name=None, scan: SeqScan|None=None) -> GapFeatures:
+        """
+        If the result of scan() is given, its gaps are used and the sequence is not scanned again.
+        Returns GapFeatures, a read-only list of rows that are created only when they are written (see annotation.py).
+        seq_name is set to the first row for draft genomes (source feature is described in COMMON).
+        """
+        gaps = scan.n_runs if scan is not None else self.find_gaps(seq)
+        return GapFeatures(seq_name, gaps, self)
 
 if __name__ == "__main__":
     config = GapAnnotator()
@@ -1,135 +1,399 @@
-import pandas as pd
 import os
+from typing import TYPE_CHECKING, Iterable, Iterator
+from dataclasses import dataclass, field
 import json
-import datetime
-from .schema_util import get_remote_schema, load_json_file, validate_json, get_subschema_for_category, set_default_to_json
+from .schema_util import get_remote_schema, load_json_file, validate_json, get_category_schema, get_category_defaults, RowValidator, CATEGORIES
 import copy
 from .json2mss import create_qualifier, create_feature, create_common
-from .seq_util import create_source_feature, read_fasta, check_number_of_seqs
+from .seq_util import create_source_feature, read_fasta, iter_fasta, read_fasta_ids, check_number_of_seqs, iter_checked_seqs, to_seq_record
+from .fasta_mmap import is_mappable
 import math
 from .gap_annotator import GapAnnotator
+from .mss_writer import MSSWriter
+from .annotation import AnnotationBuffer
+from .shard_writer import output_shards
+from .row_mapper import RowMapper, dict_to_row
+from .metrics import RowMetrics, NULL_METRICS
+from .progress import RowProgress, NULL_PROGRESS
 
-def initialize_json_data_and_schema(base_json_data, base_schema, _trad_submission_category):
+if TYPE_CHECKING:
+    import pandas as pd
+    from .record_cache import RecordCache
+
+def get_category_error(base_schema, _trad_submission_category):
     """
-    initilize json data and json schema for the given submission category.
-    only internally used from row_to_dict
+    Return an error message if the category is not one of the enum of the schema, otherwise None
+    """
+    categories = base_schema.get("properties", {}).get("_trad_submission_category", {}).get("enum", CATEGORIES)
+    if _trad_submission_category not in categories:
+        return f"_trad_submission_category: {_trad_submission_category!r} is not one of {categories}"
+    return None
+
+
+def create_category_template(base_json_data, base_schema, _trad_submission_category):
+    """
+    Return json data filled with default values and json schema reduced for the given submission category.
+    Raises ValueError for a category that is not in the schema.
     """
+    error = get_category_error(base_schema, _trad_submission_category)
+    if error:
+        raise ValueError(error)
     json_data = copy.deepcopy(base_json_data)
-    schema = copy.deepcopy(base_schema)
-    get_subschema_for_category(schema, _trad_submission_category)
+    schema = get_category_schema(base_schema, _trad_submission_category)  # reduced schema from the schema cache
     json_data["_trad_submission_category"] = _trad_submission_category
-    set_default_to_json(json_data, schema)
+    defaults = get_category_defaults(base_schema, _trad_submission_category, schema)  # compiled in the schema cache
+    defaults.apply(json_data)
+    schema = defaults.resolve_schema(schema)  # with the $ref-merged definitions, as validated before
+    return json_data, schema
+
+
+@dataclass
+class CategoryTemplates:
+    """
+    Templates (defaulted json data, reduced schema) and validators of the submission categories for one set of
+    common metadata and schema. Each is created once on first use and reused for all rows.
+    The owner of the base data (the worker context of batch_runner.py, MSSConverter) keeps this object, so the cached
+    entries live as long as the base data. The base data must not be modified after the first use.
+    The returned objects must not be modified.
+    """
+    base_json_data: dict
+    base_schema: dict
+    templates: dict = field(default_factory=dict)  # category -> (json data, schema)
+    validators: dict = field(default_factory=dict)  # category -> RowValidator
+
+    def template(self, _trad_submission_category):
+        template = self.templates.get(_trad_submission_category)
+        if template is None:  # unknown categories raise ValueError and are not cached
+            template = create_category_template(self.base_json_data, self.base_schema, _trad_submission_category)
+            self.templates[_trad_submission_category] = template
+        return template
+
+    def validator(self, _trad_submission_category):
+        validator = self.validators.get(_trad_submission_category)
+        if validator is None:
+            _, schema = self.template(_trad_submission_category)
+            validator = self.validators[_trad_submission_category] = RowValidator(schema)
+        return validator
+
+
+def get_category_template(base_json_data, base_schema, _trad_submission_category, templates: CategoryTemplates|None=None):
+    """
+    Return the template of the category from templates, or a new one if templates is not given
+    """
+    if templates is not None:
+        return templates.template(_trad_submission_category)
+    return create_category_template(base_json_data, base_schema, _trad_submission_category)
+
+
+def get_category_validator(base_json_data, base_schema, _trad_submission_category, templates: CategoryTemplates|None=None):
+    """
+    Return the validator of the category from templates, or a new one if templates is not given
+    """
+    if templates is not None:
+        return templates.validator(_trad_submission_category)
+    _, schema = create_category_template(base_json_data, base_schema, _trad_submission_category)
+    return RowValidator(schema)
+
+
+def initialize_json_data_and_schema(base_json_data, base_schema, _trad_submission_category, templates=None):
+    """
+    initilize json data and json schema for the given submission category.
+    only internally used from row_to_dict
+    The cached template is copied one level deep, because row_to_dict only adds qualifiers to top-level features.
+    The schema is shared among the rows of the same category.
+    """
+    template, schema = get_category_template(base_json_data, base_schema, _trad_submission_category, templates)
+    json_data = {key: copy.copy(value) for key, value in template.items()}
     return json_data, schema
 
 
 
-def row_to_dict(row: pd.Series, base_json_data: dict, base_schema: dict) -> tuple[str, str, dict, dict, dict, dict]:
+def row_to_dict(row: "pd.Series|tuple", base_json_data: dict, base_schema: dict, mapper: RowMapper|None=None, templates: CategoryTemplates|None=None) -> tuple[str, str, dict, dict, dict, dict]:
     """
     Create dictionary from the row data in the Excel file.
     エクセル/TSVファイルの各行データから辞書を作成する
+    row is a pandas.Series, or a tuple of cell values with the RowMapper compiled from the header.
+    templates (CategoryTemplates of the base data) are used to avoid creating the category template for each row.
 
     対象ファイルのパス、登録カテゴリ、デフォルト値で補完されたjsonデータ、配列情報データ、ソース情報データ、simplifiedされたスキーマを返す
     """
+    if mapper is None:
+        mapper = RowMapper.compile(row.index)
+    values = row if isinstance(row, tuple) else tuple(row)
 
-    def str2array(value: str) -> list[str]:
-        return [v.strip() for v in value.split(";")]
-
-    _trad_submission_category = row[("_", "_trad_submission_category")]
-    file_path = row[("_", "_file_path")]
-    json_data, schema = initialize_json_data_and_schema(base_json_data, base_schema, _trad_submission_category)
-    dict_sequence = {}
-    dict_source = {}
-
-    for feature_name, qualifier_key in row.index:
-        # print(f"{feature_name}, {qualifier_key}: {S[(feature_name, qualifier_key)]}")
-        value = row[(feature_name, qualifier_key)]
-        # feature_obj = json_data.get(feature_name)  # array for COMMENT and REFERENCE
-        if not value:
-            continue
-        if feature_name == "-":
-            continue
-        elif feature_name == "_sequence":
-            if qualifier_key in ["seq_names", "seq_types", "seq_topologies"]:
-                value = str2array(value)
-            dict_sequence[qualifier_key] = value
-        elif feature_name == "source":
-            if qualifier_key == "collection_date" and (isinstance(value, pd.Timestamp) or isinstance(value, datetime.datetime)):
-                value = value.strftime("%Y-%m-%d")
-            dict_source[qualifier_key] = value
-        elif feature_name == "COMMENT":
-            values = str2array(value)
-            json_data.setdefault(feature_name, []).append({qualifier_key: values})
-        elif qualifier_key in ["biosample", "sequence read archive"]:
-            value = value.replace(";", ",")
-            values = [v.strip() for v in value.split(",")]
-            json_data.setdefault(feature_name, {})[qualifier_key] = values
-        else:
-            json_data.setdefault(feature_name, {})[qualifier_key] = value
+    _trad_submission_category = mapper.category(values)
+    file_path = mapper.file_path(values)
+    json_data, schema = initialize_json_data_and_schema(base_json_data, base_schema, _trad_submission_category, templates)
+    dict_sequence, dict_source = mapper.apply(values, json_data)
 
-    # validate_json(json_data, schema)
+    # validation is done for all rows before processing (see validate_row)
 
     return file_path, _trad_submission_category, json_data, dict_sequence, dict_source, schema
 
 
-def create_mss(S: pd.Series, base_json_data: dict, base_schema: dict, out_dir: str, gap_annotator: GapAnnotator|None=None, hold_date: str|None=None) -> list[list[str]]:
+def validate_row(row: "pd.Series|tuple", base_json_data: dict, base_schema: dict, mapper: RowMapper|None=None, check_file: bool=True, templates: CategoryTemplates|None=None) -> list[str]:
+    """
+    Validate the json data of the row against the schema of its category, without reading the FASTA file.
+    Returns the list of error messages (empty if valid). A missing FASTA file is also reported if check_file is set.
+    """
+    if mapper is None:
+        mapper = RowMapper.compile(row.index)
+    values = row if isinstance(row, tuple) else tuple(row)
+    error = get_category_error(base_schema, mapper.category(values))
+    if error:
+        return [error]
+    file_path, _trad_submission_category, json_data, dict_sequence, dict_source, schema = row_to_dict(values, base_json_data, base_schema, mapper, templates)
+    errors = get_category_validator(base_json_data, base_schema, _trad_submission_category, templates).get_error_messages(json_data)
+    if check_file and not os.path.exists(file_path):
+        errors.append(f"_file_path: FASTA file not found: {file_path}")
+    return errors
+
+
+@dataclass
+class MSSData:
+    """
+    Contents of the MSS files of one row, created by build_mss.
+    annot is the COMMON rows (AnnotationBuffer), and entries yields (annotation rows, renamed SeqRecord) for each sequence.
+    entries is an iterator and can be consumed only once (by collect, write or create_mss).
+    """
+    file_path: str
+    category: str
+    prefix: str
+    annot: AnnotationBuffer
+    entries: Iterator
+
+    def collect(self) -> tuple[AnnotationBuffer, list]:
+        """
+        Consume the entries and return all annotation rows and the list of renamed SeqRecords (Bio.SeqRecord).
+        Memory-mapped and cached records are converted, so their sequences are read into memory.
+        """
+        annot = AnnotationBuffer(self.annot)
+        seq_records = []
+        for entry_annot, seq_record in self.entries:
+            annot += entry_annot
+            seq_records.append(to_seq_record(seq_record))
+        return annot, seq_records
+
+    def write(self, annot_file, seq_file):
+        """
+        Write the annotation (.ann) to annot_file (text) and the sequences (.fa) to seq_file (binary or text)
+        file-like objects, which are not closed. Entries are written one by one as they are created.
+        """
+        with MSSWriter(annot_file=annot_file, seq_file=seq_file) as writer:
+            writer.write_annotation(self.annot)
+            for entry_annot, seq_record in self.entries:
+                writer.write_annotation(entry_annot)
+                writer.write_sequence(seq_record.id, seq_record.seq)
+
 
-    file_path, _trad_submission_category, json_data, dict_sequence, dict_source, schema = row_to_dict(S, base_json_data, base_schema)
+def build_mss(S: "pd.Series|tuple|dict", base_json_data: dict, base_schema: dict, gap_annotator: GapAnnotator|None=None, hold_date: str|None=None, streaming: bool=False, mapper: RowMapper|None=None, metrics: RowMetrics|None=None, progress: RowProgress|None=None, seq_records: Iterable|None=None, record_cache: "RecordCache|None"=None, templates: CategoryTemplates|None=None) -> MSSData:
+    """
+    Create the contents of the MSS files for one row without writing files.
+    S can also be a dict of {feature name: {qualifier key: value}} with the same columns as the sample sheet (see dict_to_row).
+    If seq_records (SeqRecord-like objects with id and seq) are given, they are used instead of reading the FASTA file
+    of the row, which is then not required. Otherwise the FASTA file is read (one by one in streaming mode).
+    Sequences are scanned for gaps while the entries are iterated.
+    """
+    metrics = metrics or NULL_METRICS
+    progress = progress or NULL_PROGRESS
+    read_records = record_cache.read_fasta if record_cache else read_fasta
+    if isinstance(S, dict):
+        columns, S = dict_to_row(S)
+        mapper = RowMapper.compile(columns)
+
+    with metrics.stage("row_to_dict"):
+        file_path, _trad_submission_category, json_data, dict_sequence, dict_source, schema = row_to_dict(S, base_json_data, base_schema, mapper, templates)
 
-    print(f"Creating MSS submission files for {_trad_submission_category} from {file_path}")
-    annot = create_common(json_data)  # COMMON Feature (list of 5-element lists)
+    print(f"Creating MSS submission files for {_trad_submission_category} from {file_path or 'records'}")
+    with metrics.stage("create_common"):
+        annot = AnnotationBuffer(create_common(json_data))  # COMMON Feature (5-element rows)
     if hold_date:
         annot.append(["", "DATE", "", "hold_date", hold_date])
 
+    with metrics.stage("read_fasta"):
+        if seq_records is not None:
+            seq_records = seq_records if isinstance(seq_records, list) else list(seq_records)
+            seq_ids = [seq_record.id for seq_record in seq_records]
+        elif streaming:
+            seq_records = metrics.iter_stage("read_fasta", iter_fasta(file_path))
+            # IDs are read in advance only if it is cheap (memory-mapped files) or required (numbering with seq_prefix of WGS).
+            # Otherwise the number of sequences is checked while the records are streamed (see iter_checked_seqs).
+            if is_mappable(file_path) or (_trad_submission_category in ["WGS", "MAG-WGS"] and dict_sequence.get("seq_prefix")):
+                seq_ids = read_fasta_ids(file_path)
+            else:
+                seq_ids = None
+        else:
+            seq_records = read_records(file_path)
+            seq_ids = [seq_record.id for seq_record in seq_records]
+
     # creating source feature and assembly_gap feature
     if _trad_submission_category in ["GNM", "MAG"]:
-        seq_records = read_fasta(file_path)
-        check_number_of_seqs(seq_records, dict_sequence)
-        for seq_record, seq_name, seq_type, seq_topology in zip(seq_records, dict_sequence["seq_names"], dict_sequence["seq_types"], dict_sequence["seq_topologies"]):
-            source_feature = create_source_feature(_trad_submission_category, seq_name, seq_type, seq_topology, dict_source)
-            annot += source_feature
-            # add gap features
-            if gap_annotator:
-                annot += gap_annotator.create_gap_feature(str(seq_record.seq), seq_name=None)
-            seq_record.id = seq_name
-            seq_record.name, seq_record.description = "", ""
+        if seq_ids is None:
+            seq_records = iter_checked_seqs(seq_records, dict_sequence)
+        else:
+            check_number_of_seqs(seq_ids, dict_sequence)
+        entries = iter_complete_entries(_trad_submission_category, seq_records, dict_sequence, dict_source, gap_annotator, metrics, progress)
 
     elif _trad_submission_category in ["WGS", "MAG-WGS"]:
-        seq_records = read_fasta(file_path)
-        seq_prefix = dict_sequence.get("seq_prefix")
         seq_name, seq_type, seq_topology = None, None, None
         source_feature = create_source_feature(_trad_submission_category, seq_name, seq_type, seq_topology, dict_source)
         annot += source_feature
-        num_width = int(math.log10(len(seq_records))) + 1
-        for i, seq_record in enumerate(seq_records, 1):
-            if seq_prefix:
-                seq_name = f"{seq_prefix}_{str(i).zfill(num_width)}"
-            else:
-                seq_name = seq_record.id
-            if gap_annotator:
-                annot += gap_annotator.create_gap_feature(str(seq_record.seq), seq_name)
-            seq_record.id = seq_name
-            seq_record.name, seq_record.description = "", ""
+        num_seqs = len(seq_ids) if seq_ids is not None else None
+        entries = iter_draft_entries(seq_records, num_seqs, dict_sequence.get("seq_prefix"), gap_annotator, metrics, progress)
+
+    prefix = get_output_prefix(json_data, dict_source)
+    return MSSData(file_path, _trad_submission_category, prefix, annot, entries)
+
+
+def create_mss(S: "pd.Series|tuple", base_json_data: dict, base_schema: dict, out_dir: str, gap_annotator: GapAnnotator|None=None, hold_date: str|None=None, streaming: bool=False, mapper: RowMapper|None=None, gzip_threads: int|None=None, metrics: RowMetrics|None=None, progress: RowProgress|None=None, preloaded_records: list|None=None, record_cache: "RecordCache|None"=None, shard_bytes: int|None=None, shard_records: int|None=None, templates: CategoryTemplates|None=None) -> list[str]:
+    """
+    Create MSS files ({prefix}.ann and {prefix}.fa) for one row of the sample sheet and return their paths.
+    In streaming mode, sequences are read, annotated and written one by one instead of being loaded all at once.
+    If gzip_threads is set, the files are gzip-compressed with the given number of threads.
+    If metrics (RowMetrics) is given, time and memory of each stage are recorded into it.
+    If progress (RowProgress) is given, it is updated for each sequence.
+    preloaded_records are the records already read from the FASTA file (e.g. prefetched), used instead of reading
+    the file again. They are ignored in streaming mode.
+    If record_cache (RecordCache) is given, records and scan results are shared with other rows reading the same file.
+    If shard_bytes or shard_records is set, the entries are split into several file pairs and a shard index (see shard_writer.py).
+    To get the contents without writing files, use build_mss.
+    """
+    metrics = metrics or NULL_METRICS
+    if streaming:
+        preloaded_records = None
+    data = build_mss(S, base_json_data, base_schema, gap_annotator, hold_date, streaming, mapper, metrics, progress,
+                     preloaded_records, record_cache, templates)
+
+    if metrics is not NULL_METRICS and data.file_path and os.path.isfile(data.file_path):  # no file for preloaded records
+        metrics.count("input_bytes", os.path.getsize(data.file_path))
+    prefix, annot, entries = data.prefix, data.annot, data.entries
+    if shard_bytes or shard_records:
+        output_files = output_shards(out_dir, prefix, annot, entries, shard_bytes, shard_records, gzip_threads, metrics=metrics)
+    elif streaming:
+        output_files = output_stream(out_dir, prefix, annot, entries, gzip_threads, metrics)
+    else:
+        annot, seq_records = data.collect()
+        output_files = output(out_dir, prefix, annot, seq_records, gzip_threads, metrics)
+    metrics.count("output_bytes", sum(os.path.getsize(output_file) for output_file in output_files))
+    return output_files
+
+
+def iter_complete_entries(_trad_submission_category, seq_records, dict_sequence, dict_source, gap_annotator=None, metrics=NULL_METRICS, progress=NULL_PROGRESS):
+    """
+    Yield (annotation rows, renamed SeqRecord) for each sequence of complete genomes (GNM and MAG)
+    seq_names may be filled while seq_records are iterated (see iter_checked_seqs), so they are looked up by position.
+    """
+    seq_names, seq_types, seq_topologies = dict_sequence["seq_names"], dict_sequence["seq_types"], dict_sequence["seq_topologies"]
+    for i, seq_record in enumerate(seq_records):
+        if i >= len(seq_types):
+            break
+        seq_name, seq_type, seq_topology = seq_names[i], seq_types[i], seq_topologies[i]
+        entry_annot = AnnotationBuffer(create_source_feature(_trad_submission_category, seq_name, seq_type, seq_topology, dict_source))
+        scan = None
+        # add gap features
+        if gap_annotator:
+            gap_feature, scan = annotate_gaps(gap_annotator, seq_record, None, metrics)
+            entry_annot += gap_feature
+        seq_record.id = seq_name
+        seq_record.name, seq_record.description = "", ""
+        count_entry(seq_record, scan, metrics, progress)
+        yield entry_annot, seq_record
+
 
+def iter_draft_entries(seq_records, num_seqs, seq_prefix=None, gap_annotator=None, metrics=NULL_METRICS, progress=NULL_PROGRESS):
+    """
+    Yield (annotation rows, renamed SeqRecord) for each sequence of draft genomes (WGS and MAG-WGS)
+    num_seqs (for the width of the numbers) may be None if seq_prefix is not given.
+    """
+    num_width = int(math.log10(num_seqs)) + 1 if num_seqs is not None else 0
+    for i, seq_record in enumerate(seq_records, 1):
+        if seq_prefix:
+            seq_name = f"{seq_prefix}_{str(i).zfill(num_width)}"
+        else:
+            seq_name = seq_record.id
+        entry_annot, scan = annotate_gaps(gap_annotator, seq_record, seq_name, metrics) if gap_annotator else ([], None)
+        seq_record.id = seq_name
+        seq_record.name, seq_record.description = "", ""
+        count_entry(seq_record, scan, metrics, progress)
+        yield entry_annot, seq_record
+
+
+def count_entry(seq_record, scan, metrics=NULL_METRICS, progress=NULL_PROGRESS):
+    """
+    Count the record and its bases for metrics and progress. The length is taken from the gap scan if any.
+    Nothing is done when both are disabled, as len() of a MappedSequence reads the whole sequence.
+    """
+    if metrics is NULL_METRICS and progress is NULL_PROGRESS:
+        return
+    seq_length = scan.length if scan is not None else len(seq_record.seq)
+    metrics.count("records")
+    metrics.count("bases", seq_length)
+    progress.update(seq_length)
+
+
+def annotate_gaps(gap_annotator, seq_record, seq_name, metrics=NULL_METRICS):
+    """
+    Scan the sequence once, then create assembly_gap features from the N runs. Returns (gap features, SeqScan).
+    Characters that are not IUPAC nucleotide codes are reported as a warning. It is printed (not logged) so that
+    it is captured with the other messages of the row and output in the row order with --jobs (see batch_runner.py).
+    """
+    scans = getattr(seq_record, "scans", None)  # scan results kept in the record cache (see record_cache.py)
+    with metrics.stage("gap_annotation"):
+        scan = scans.get(gap_annotator.min_gap_length) if scans is not None else None
+        if scan is None:
+            scan = gap_annotator.scan(seq_record.seq)
+            if scans is not None:
+                scans[gap_annotator.min_gap_length] = scan
+        gap_feature = gap_annotator.create_gap_feature(seq_record.seq, seq_name, scan)
+    if scan.illegal_count:
+        positions = ", ".join(str(position + 1) for position in scan.illegal_positions)
+        if scan.illegal_count > len(scan.illegal_positions):
+            positions += ", ..."
+        print(f"WARNING: {seq_record.id}: {scan.illegal_count} illegal character(s) ({scan.illegal_chars}) at {positions}")
+    metrics.count("gaps", len(scan.n_runs))
+    metrics.count("gc_bases", scan.gc_count)
+    metrics.count("n_bases", scan.n_count)
+    metrics.count("illegal_chars", scan.illegal_count)
+    return gap_feature, scan
+
+
+def get_output_prefix(json_data, dict_source):
     biosample = json_data.get("DBLINK", {}).get("biosample", ["NO_BIOSAMPLE"])
     biosample = ",".join(biosample)
     strain = dict_source.get("strain")
     isolate = dict_source.get("isolate")
     identifier = strain or isolate or "NO_IDENTIFIER"
-    prefix = f"{biosample}_{identifier}".replace(" ", "_")
-    output(out_dir, prefix, annot, seq_records)
-
-    # return annot, seq_records
-
-def output(out_dir, prefix, annot, seq_records):
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir)
-    out_annot = os.path.join(out_dir, f"{prefix}.ann")
-    out_seq = os.path.join(out_dir, f"{prefix}.fa")
-    with open(out_annot, "w") as f:
-        for row in annot:
-            f.write("\t".join(map(str, row)) + "\n")
-    with open(out_seq, "w") as f:
+    return f"{biosample}_{identifier}".replace(" ", "_")
+
+
+def output(out_dir, prefix, annot, seq_records, gzip_threads=None, metrics=NULL_METRICS):
+    with metrics.stage("output"), MSSWriter(out_dir, prefix, gzip_threads=gzip_threads) as writer:
+        writer.write_annotation(annot)
         for seq_record in seq_records:
-            seq_record.seq = seq_record.seq.lower().strip("/")
-            f.write(seq_record.format("fasta"))
-            f.write("//\n")
+            writer.write_sequence(seq_record.id, seq_record.seq)
+    return writer.output_files
+
+
+def output_stream(out_dir, prefix, annot, entries, gzip_threads=None, metrics=NULL_METRICS):
+    """
+    Same as output(), but annotation rows and sequences are written as soon as each entry is created.
+    Only the writing is measured as the output stage, as reading and gap annotation are done while iterating entries.
+    If an error occurs while iterating (e.g. the number of sequences is found inconsistent), the partial files are removed.
+    """
+    writer = MSSWriter(out_dir, prefix, gzip_threads=gzip_threads)
+    try:
+        with writer:
+            with metrics.stage("output"):
+                writer.write_annotation(annot)
+            for entry_annot, seq_record in entries:
+                with metrics.stage("output"):
+                    writer.write_annotation(entry_annot)
+                    writer.write_sequence(seq_record.id, seq_record.seq)
+            with metrics.stage("output"):
+                writer.close()  # flush (and finish compression)
+    except Exception:
+        for output_file in writer.output_files:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+        raise
+    return writer.output_files
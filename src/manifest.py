@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import logging
+from dataclasses import asdict
+
+# Manifest for incremental runs (--incremental option of MSSmaker.py).
+# For each output prefix, the hash of the inputs (row values, common metadata, schema, gap parameters, hold date, output options)
+# and the size/mtime/hash of the FASTA file are recorded in {out_dir}/mss_manifest.json.
+# Rows whose inputs are unchanged since the last run are skipped.
+
+MANIFEST_FILE = "mss_manifest.json"
+MANIFEST_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def hash_json(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+
+def hash_file(file_name, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+
+def get_file_info(file_name, previous=None):
+    """
+    Return size, mtime and sha256 of the file.
+    The hash recorded previously is reused when size and mtime are not changed.
+    """
+    stat = os.stat(file_name)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        return previous
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hash_file(file_name)}
+
+
+class Manifest:
+
+    def __init__(self, out_dir, base_json_data, base_schema, gap_annotator=None, hold_date=None, output_options=None):
+        self.out_dir = out_dir
+        self.file_name = os.path.join(out_dir, MANIFEST_FILE)
+        self.entries = {}
+        self.seen_prefixes = set()
+        if os.path.exists(self.file_name):
+            with open(self.file_name, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("entries", {})
+        # inputs common to all rows
+        self.common_hash = hash_json({
+            "metadata": base_json_data,
+            "schema": hash_json(base_schema),
+            "gap": asdict(gap_annotator) if gap_annotator else None,
+            "hold_date": hold_date,
+            "output": output_options,
+        })
+
+    def row_hash(self, columns, values):
+        return hash_json({"common": self.common_hash, "columns": columns, "values": values})
+
+    def is_up_to_date(self, prefix, row_hash, file_path):
+        """
+        Check the recorded entry and output files. Returns (up_to_date, file info of the FASTA file)
+        """
+        self.seen_prefixes.add(prefix)
+        entry = self.entries.get(prefix)
+        if not os.path.exists(file_path):
+            return False, None
+        file_info = get_file_info(file_path, entry.get("fasta") if entry else None)
+        if not entry or entry.get("row_hash") != row_hash or entry.get("fasta", {}).get("sha256") != file_info["sha256"]:
+            return False, file_info
+        for output_file in entry.get("outputs", []):
+            if not os.path.exists(os.path.join(self.out_dir, output_file)):
+                return False, file_info
+        return True, file_info
+
+    def update(self, prefix, row_hash, file_path, file_info, outputs):
+        self.entries[prefix] = {
+            "row_hash": row_hash,
+            "file_path": file_path,
+            "fasta": file_info or get_file_info(file_path),
+            "outputs": outputs,
+        }
+
+    def report_stale(self):
+        """
+        Report outputs of the prefixes that are recorded in the manifest but not produced from the current sheet.
+        Entries whose output files have been removed are dropped from the manifest.
+        """
+        for prefix in sorted(set(self.entries) - self.seen_prefixes):
+            outputs = [f for f in self.entries[prefix].get("outputs", []) if os.path.exists(os.path.join(self.out_dir, f))]
+            if outputs:
+                logger.warning(f"Stale output (not in the current sample sheet): {', '.join(outputs)}")
+            else:
+                del self.entries[prefix]
+
+    def save(self):
+        if not os.path.exists(self.out_dir):
+            os.makedirs(self.out_dir)
+        tmp_file = self.file_name + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_file, self.file_name)
@@ -0,0 +1,116 @@
+import json
+import time
+import tracemalloc
+import contextlib
+
+# Per-row instrumentation (--metrics option of MSSmaker.py).
+# create_mss records wall/CPU time and peak memory (tracemalloc) of each stage
+# (row_to_dict, create_common, read_fasta, gap_annotation, output) and counts (records, bases, gaps, bytes).
+# A stage can be entered many times (e.g. once per sequence in streaming mode); times are summed and the peak is the max.
+# When metrics are disabled, NULL_METRICS is used, whose methods do nothing.
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class RowMetrics:
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.wall = self.cpu = None
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+
+    def finish(self):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measure the enclosed block as (a part of) the stage. Stages must not be nested.
+        """
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = tracemalloc.get_traced_memory()[1] - memory
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = {"wall": wall, "cpu": cpu, "peak_memory": peak, "calls": 1}
+            else:
+                stage["wall"] += wall
+                stage["cpu"] += cpu
+                stage["peak_memory"] = max(stage["peak_memory"], peak)
+                stage["calls"] += 1
+
+    def iter_stage(self, name, iterable):
+        """
+        Yield items of the iterable, measuring the time to get each item as the stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def count(self, name, value=1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def to_dict(self):
+        data = {"wall": self.wall, "cpu": self.cpu, "stages": self.stages, "counts": self.counts}
+        if resource is not None:
+            data["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return data
+
+
+class NullMetrics:
+    """
+    Used when metrics are disabled.
+    """
+    _null_context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_context
+
+    def iter_stage(self, name, iterable):
+        return iterable
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def record_metrics(results, file_name):
+    """
+    Write metrics of each RowResult to file_name as JSON lines, and yield the results.
+    """
+    with open(file_name, "w", encoding="utf-8") as f:
+        for result in results:
+            data = {"index": result.index, "file_path": result.file_path}
+            if result.skipped:
+                data["status"] = "skipped"
+            else:
+                data["status"] = "succeeded" if result.ok else "failed"
+                data.update(result.metrics or {})
+            f.write(json.dumps(data, ensure_ascii=False) + "\n")
+            f.flush()
+            yield result
@@ -0,0 +1,83 @@
+import os
+import copy
+from typing import Iterable
+from .schema_util import load_json_file, get_local_schema
+from .main_mss_maker import build_mss, create_mss, validate_row, MSSData, CategoryTemplates
+from .row_mapper import RowMapper, dict_to_row
+from .gap_annotator import GapAnnotator
+
+# Library API to create MSS data from Python code, without a sample sheet or a subprocess.
+#   converter = MSSConverter("common.json", GapAnnotator())
+#   data = converter.build({"_": {"_trad_submission_category": "WGS"}, "source": {...}, ...}, fasta="genome.fa")
+#   annot, seq_records = data.collect()           # annotation rows and renamed SeqRecords in memory
+#   data.write(annot_file, seq_file)              # or write to file-like objects
+#   converter.create(row, out_dir, fasta=...)     # or write {prefix}.ann and {prefix}.fa as MSSmaker.py does
+# Records can be given as any iterable of SeqRecord-like objects (with id and seq) instead of a FASTA file.
+# The metadata, schema and per-category templates are loaded once per converter and reused for all rows.
+
+
+class MSSConverter:
+
+    def __init__(self, metadata: str|dict, gap_annotator: GapAnnotator|None=None, hold_date: str|None=None, schema: dict|None=None):
+        """
+        metadata is the common metadata (dict or path to the JSON file). schema is the JSON schema (the local schema by default).
+        A dict metadata is copied, so that later changes by the caller do not leave stale templates.
+        """
+        self.base_json_data = load_json_file(metadata) if isinstance(metadata, (str, os.PathLike)) else copy.deepcopy(metadata)
+        if self.base_json_data is None:
+            raise ValueError(f"Failed to load the metadata: {metadata}")
+        self.base_schema = schema or get_local_schema()
+        self.gap_annotator = gap_annotator
+        self.hold_date = hold_date
+        self.mappers = {}  # RowMapper for each set of columns
+        self.templates = CategoryTemplates(self.base_json_data, self.base_schema)  # created on first use of each category
+
+    def to_row(self, row: dict|tuple, mapper: RowMapper|None=None, fasta: str|None=None) -> tuple[tuple, RowMapper]:
+        """
+        Convert the row ({feature name: {qualifier key: value}}, or a tuple with its mapper) into (tuple, RowMapper)
+        """
+        if isinstance(row, dict):
+            if fasta is not None:
+                row = {**row, "_": {**row.get("_", {}), "_file_path": fasta}}
+            columns, row = dict_to_row(row)
+            mapper = self.mappers.get(tuple(columns))
+            if mapper is None:
+                mapper = self.mappers[tuple(columns)] = RowMapper.compile(columns)
+        elif fasta is not None:
+            row = row[:mapper.file_path_index] + (fasta,) + row[mapper.file_path_index + 1:]
+        return row, mapper
+
+    def validate(self, row: dict|tuple, mapper: RowMapper|None=None, fasta: str|None=None, check_file: bool=True) -> list[str]:
+        """
+        Return the validation errors of the row (empty if valid)
+        """
+        row, mapper = self.to_row(row, mapper, fasta)
+        return validate_row(row, self.base_json_data, self.base_schema, mapper, check_file, self.templates)
+
+    def build(self, row: dict|tuple, fasta: str|None=None, seq_records: Iterable|None=None, mapper: RowMapper|None=None,
+              streaming: bool=False, validate: bool=True) -> MSSData:
+        """
+        Create the MSS data of the row from the FASTA file (fasta or "_file_path" of the row) or seq_records.
+        If validate is set, ValueError is raised for an invalid row.
+        """
+        row, mapper = self.to_row(row, mapper, fasta)
+        if validate:
+            errors = validate_row(row, self.base_json_data, self.base_schema, mapper, check_file=seq_records is None,
+                                  templates=self.templates)
+            if errors:
+                raise ValueError("Invalid row: " + "; ".join(errors))
+        return build_mss(row, self.base_json_data, self.base_schema, self.gap_annotator, self.hold_date, streaming, mapper,
+                         seq_records=seq_records, templates=self.templates)
+
+    def create(self, row: dict|tuple, out_dir: str, fasta: str|None=None, mapper: RowMapper|None=None, validate: bool=True, **options) -> list[str]:
+        """
+        Write {prefix}.ann and {prefix}.fa to out_dir as MSSmaker.py does, and return their paths.
+        options are passed to create_mss (streaming, gzip_threads, shard_bytes...).
+        """
+        row, mapper = self.to_row(row, mapper, fasta)
+        if validate:
+            errors = self.validate(row, mapper)
+            if errors:
+                raise ValueError("Invalid row: " + "; ".join(errors))
+        return create_mss(row, self.base_json_data, self.base_schema, out_dir, self.gap_annotator, self.hold_date,
+                          mapper=mapper, templates=self.templates, **options)
@@ -0,0 +1,138 @@
+import io
+import os
+from functools import cache
+from .seq_util import iter_seq_chunks
+from .compressed_io import open_gzip_output
+from .annotation import iter_annotation_text
+
+# Writer of MSS files ({prefix}.ann and {prefix}.fa).
+# Sequences are written from their buffers chunk by chunk: lowercased with a lookup table and wrapped
+# into 60-column lines in one numpy operation per chunk. The output is the same as SeqRecord.format("fasta")
+# after seq.lower().strip("/"), followed by "//".
+
+LINE_WIDTH = 60
+WRITE_BUFFER_SIZE = 1 << 22  # 4 MB
+ANNOTATION_BATCH = 10000  # number of annotation rows formatted at once
+
+
+@cache
+def get_lower_table():
+    import numpy as np
+    table = np.arange(256, dtype=np.uint8)
+    table[ord("A"):ord("Z") + 1] += ord("a") - ord("A")
+    return table
+
+
+def wrap_lines(data, width=LINE_WIDTH):
+    """
+    Lowercase data (length must be a multiple of width) and return it with a line break after every width bytes.
+    """
+    import numpy as np
+    lines = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)
+    out = np.empty((lines.shape[0], width + 1), dtype=np.uint8)
+    np.take(get_lower_table(), lines, out=out[:, :width])
+    out[:, width] = ord("\n")
+    return out
+
+
+def count_trailing_slashes(data):
+    if data[-1:] != b"/":
+        return 0
+    data = bytes(data)
+    return len(data) - len(data.rstrip(b"/"))
+
+
+class TextSeqFile:
+    """
+    Adapter to write the sequence bytes to a text file-like object
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(bytes(data).decode("ascii"))
+
+    def flush(self):
+        self.file.flush()
+
+
+class MSSWriter:
+    """
+    Write annotation rows to {prefix}.ann and sequences to {prefix}.fa through large write buffers.
+    """
+
+    def __init__(self, out_dir=None, prefix=None, width=LINE_WIDTH, gzip_threads=None, annot_file=None, seq_file=None):
+        """
+        If gzip_threads is set, {prefix}.ann.gz and {prefix}.fa.gz are written instead, compressed in parallel
+        by the given number of threads while the sequences are being written.
+        If annot_file (text) and seq_file (binary or text) file-like objects are given, they are written instead of files
+        in out_dir. They are flushed but not closed by close().
+        """
+        self.width = width
+        if annot_file is not None and seq_file is not None:
+            self.out_annot = self.out_seq = None
+            self.annot_file = annot_file
+            self.seq_file = seq_file if not isinstance(seq_file, io.TextIOBase) else TextSeqFile(seq_file)
+            self.owns_files = False
+            return
+        self.owns_files = True
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        suffix = ".gz" if gzip_threads else ""
+        self.out_annot = os.path.join(out_dir, f"{prefix}.ann{suffix}")
+        self.out_seq = os.path.join(out_dir, f"{prefix}.fa{suffix}")
+        if gzip_threads:
+            self.annot_file = open_gzip_output(self.out_annot, "w", threads=gzip_threads)
+            self.seq_file = open_gzip_output(self.out_seq, "wb", threads=gzip_threads)
+        else:
+            self.annot_file = open(self.out_annot, "w", buffering=WRITE_BUFFER_SIZE)
+            self.seq_file = open(self.out_seq, "wb", buffering=WRITE_BUFFER_SIZE)
+
+    @property
+    def output_files(self):
+        return [self.out_annot, self.out_seq] if self.owns_files else []
+
+    def write_annotation(self, annot):
+        """
+        annot is a list of rows, GapFeatures or AnnotationBuffer (see annotation.py)
+        """
+        for text in iter_annotation_text(annot, ANNOTATION_BATCH):
+            self.annot_file.write(text)
+
+    def write_sequence(self, seq_id, seq):
+        """
+        seq can be Bio.Seq, str, bytes-like or MappedSequence
+        """
+        f, width = self.seq_file, self.width
+        f.write(f">{seq_id}\n".encode())
+        rest = b""  # incomplete line, or "/" at the end that may be stripped, carried to the next chunk
+        leading = True
+        for chunk in iter_seq_chunks(seq):
+            if leading:  # same as seq.strip("/")
+                if chunk[:1] == b"/":
+                    chunk = bytes(chunk).lstrip(b"/")
+                leading = not len(chunk)
+            data = rest + chunk if rest else chunk
+            full_length = (len(data) - count_trailing_slashes(data)) // width * width
+            if full_length:
+                f.write(wrap_lines(data[:full_length], width))
+            rest = bytes(data[full_length:])
+        rest = rest.rstrip(b"/")
+        for i in range(0, len(rest), width):
+            f.write(rest[i:i + width].lower() + b"\n")
+        f.write(b"//\n")
+
+    def close(self):
+        if self.owns_files:
+            self.annot_file.close()
+            self.seq_file.close()
+        else:
+            self.annot_file.flush()
+            self.seq_file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
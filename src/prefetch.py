@@ -0,0 +1,67 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .compressed_io import detect_compression
+from .seq_util import read_fasta
+
+# Background prefetch of FASTA files (--prefetch option of MSSmaker.py).
+# While create_mss works on the current row, the FASTA files of the next rows are read (and decompressed)
+# on a thread pool. The number of rows read ahead (depth) and their estimated size in memory (byte budget) are bounded.
+# Decompression (zlib, lzma, bz2) releases the GIL, so I/O and decompression overlap with the processing of the current row.
+
+PREFETCH_DEPTH = 1
+PREFETCH_MEMORY = 1 << 30  # 1 GB
+COMPRESSION_RATIO = 4  # assumed ratio of the decompressed size to the file size of compressed files
+
+_END = object()
+
+
+def estimate_loaded_size(file_path):
+    """
+    Estimated memory size of the records read from the FASTA file
+    """
+    try:
+        size = os.path.getsize(file_path)
+        return size * COMPRESSION_RATIO if detect_compression(file_path) else size
+    except OSError:
+        return 0
+
+
+def iter_prefetched(items, get_file_path, depth=PREFETCH_DEPTH, byte_budget=PREFETCH_MEMORY, loader=read_fasta):
+    """
+    Yield (item, future) for each item, where future gives the records of the FASTA file returned by get_file_path(item),
+    read in the background. future is None for items without a file path (e.g. rows skipped in incremental mode).
+    Up to depth items after the current one are read ahead, as long as their estimated size fits in byte_budget
+    (the current item is always read, even if it does not fit).
+    The records of an item are released once the next item is requested.
+    """
+    items = iter(items)
+    pending = deque()  # (item, future, estimated size), the first one is the current item
+    used_bytes = 0
+    blocked = _END  # item taken from items but waiting for the budget
+    with ThreadPoolExecutor(max_workers=max(depth, 1), thread_name_prefix="prefetch") as executor:
+        try:
+            while True:
+                while len(pending) <= depth:
+                    item = next(items, _END) if blocked is _END else blocked
+                    blocked = _END
+                    if item is _END:
+                        break
+                    file_path = get_file_path(item)
+                    size = estimate_loaded_size(file_path) if file_path else 0
+                    if pending and used_bytes + size > byte_budget:
+                        blocked = item
+                        break
+                    future = executor.submit(loader, file_path) if file_path else None
+                    used_bytes += size
+                    pending.append((item, future, size))
+                if not pending:
+                    return
+                item, future, size = pending.popleft()
+                yield item, future
+                item = future = None  # the records are released by the caller
+                used_bytes -= size
+        finally:
+            for _, future, _ in pending:
+                if future:
+                    future.cancel()
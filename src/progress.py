@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+
+# Progress reporting (--progress option of MSSmaker.py).
+# Events are written as JSON lines, so that a scheduler can follow a running batch and find stalled samples:
+#   row_start / row_end : a row (sample) is started / finished (written by the process that handles the row)
+#   record              : progress in the per-record loop of create_mss (at most once per interval for each row)
+#   batch               : after each row, overall progress with samples/s, bytes/s and ETA from the total FASTA bytes
+# Every event has "time" (UNIX time) and "pid". All processes append to the same file ("-" for stderr).
+
+PROGRESS_INTERVAL = 5.0  # seconds between record events of a row
+
+_reporters = {}  # reporter for each file name in the current process
+
+
+class ProgressReporter:
+
+    def __init__(self, file_name, interval=PROGRESS_INTERVAL):
+        self.file_name = file_name
+        self.interval = interval
+        # opened in append mode so that lines from several worker processes are not overwritten
+        self.file = sys.stderr if file_name == "-" else open(file_name, "a", encoding="utf-8")
+
+    def emit(self, event, **fields):
+        line = json.dumps({"event": event, "time": round(time.time(), 3), "pid": os.getpid(), **fields}, ensure_ascii=False)
+        self.file.write(line + "\n")  # one write per line
+        self.file.flush()
+
+    def row(self, index, file_path):
+        return RowProgress(self, index, file_path)
+
+
+def open_reporter(file_name, truncate=False):
+    """
+    Return the reporter of the current process for file_name. The file is emptied if truncate is set (main process).
+    """
+    if truncate and file_name != "-":
+        open(file_name, "w").close()
+    reporter = _reporters.get(file_name)
+    if reporter is None:
+        reporter = _reporters[file_name] = ProgressReporter(file_name)
+    return reporter
+
+
+class RowProgress:
+    """
+    Progress of one row, updated from the per-record loops of create_mss.
+    """
+
+    def __init__(self, reporter, index, file_path):
+        self.reporter = reporter
+        self.index = index
+        self.file_path = file_path
+        self.records = 0
+        self.bases = 0
+        self.start_time = self.last_time = time.perf_counter()
+        reporter.emit("row_start", index=index, file_path=file_path)
+
+    def _fields(self):
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "index": self.index, "file_path": self.file_path, "records": self.records, "bases": self.bases,
+            "elapsed": round(elapsed, 3), "bp_per_s": round(self.bases / elapsed) if elapsed else None,
+        }
+
+    def update(self, bases, records=1):
+        self.records += records
+        self.bases += bases
+        now = time.perf_counter()
+        if now - self.last_time >= self.reporter.interval:
+            self.last_time = now
+            self.reporter.emit("record", **self._fields())
+
+    def finish(self, status):
+        self.reporter.emit("row_end", status=status, **self._fields())
+
+
+class NullProgress:
+    """
+    Used when progress reporting is disabled.
+    """
+
+    def update(self, bases, records=1):
+        pass
+
+
+NULL_PROGRESS = NullProgress()
+
+
+def get_file_size(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except (OSError, TypeError):
+        return 0
+
+
+def report_progress(results, reporter, num_rows, total_bytes):
+    """
+    Emit a batch event after each RowResult, and yield the results.
+    The ETA is estimated from the FASTA bytes processed so far and the total FASTA bytes of the sheet.
+    """
+    start_time = time.perf_counter()
+    done, failed, done_bytes = 0, 0, 0
+    reporter.emit("batch", done=0, total=num_rows, bytes_done=0, bytes_total=total_bytes)
+    for result in results:
+        done += 1
+        failed += 0 if result.ok else 1
+        done_bytes += get_file_size(result.file_path)
+        elapsed = time.perf_counter() - start_time
+        bytes_per_s = done_bytes / elapsed if elapsed else 0
+        eta = (total_bytes - done_bytes) / bytes_per_s if bytes_per_s else None
+        status = "skipped" if result.skipped else "succeeded" if result.ok else "failed"
+        reporter.emit("batch", index=result.index, status=status, done=done, total=num_rows, failed=failed,
+                      bytes_done=done_bytes, bytes_total=total_bytes, elapsed=round(elapsed, 3),
+                      samples_per_s=round(done / elapsed, 3) if elapsed else None, bytes_per_s=round(bytes_per_s),
+                      eta=round(max(eta, 0), 1) if eta is not None else None)
+        yield result
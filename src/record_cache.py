@@ -0,0 +1,188 @@
+import os
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from .manifest import hash_file
+from .seq_util import read_fasta
+
+# Cache of parsed FASTA records shared by rows that refer to the same file (--cache_memory option of MSSmaker.py).
+# Entries are keyed by the identity of the file (device, inode, size, mtime). Only when another file of the same size is
+# read, both files are hashed (sha256) and share an entry if the contents are the same, so the same data under another
+# path is also served from the cache without hashing every file.
+# Records are kept with the results of the sequence scan (N runs etc., see seq_scan.py), and are evicted
+# in LRU order when the total size exceeds the memory budget. If a spill directory is given, evicted entries
+# are saved there (pickle) and loaded again on the next access without decompressing or parsing the FASTA file.
+# Memory-mapped records (uncompressed files, see fasta_mmap.py) are not kept, because mapping the file again is cheap
+# and each mapping holds a file descriptor. Only their scan results are cached, and the file is mapped on each access.
+# Callers get new record objects for each access, because create_mss renames the records.
+
+RECORD_OVERHEAD = 200  # rough memory size of a record except its sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedRecord:
+    """
+    Minimal substitute of Bio.SeqRecord handed out from the cache. The sequence and scans are shared with the cache entry.
+    """
+    id: str
+    seq: object
+    name: str = ""
+    description: str = ""
+    scans: dict = field(default_factory=dict)  # min_gap_length -> SeqScan
+
+
+@dataclass
+class CacheEntry:
+    records: list[tuple[str, object, str, str]]|None  # (id, seq, name, description) as read from the file, None if memory-mapped
+    scans: list[dict]  # for each record, min_gap_length -> SeqScan
+    size: int
+
+    def new_records(self, records=None):
+        """
+        Return new CachedRecords. records (e.g. mapped again from the file) are used instead of the kept ones if given.
+        """
+        records = self.records if records is None else records
+        return [CachedRecord(id, seq, name, description, scans)
+                for (id, seq, name, description), scans in zip(records, self.scans)]
+
+
+def get_record_tuples(seq_records):
+    return [(r.id, r.seq, r.name, r.description) for r in seq_records]
+
+
+def is_mapped(seq):
+    return hasattr(seq, "iter_chunks")  # MappedSequence
+
+
+class RecordCache:
+
+    def __init__(self, memory_budget, spill_dir=None, loader=read_fasta):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.loader = loader
+        self.entries = OrderedDict()  # content key -> CacheEntry, in LRU order
+        self.used_bytes = 0
+        self.content_keys = {}  # (st_dev, st_ino, st_size, st_mtime_ns) -> content key
+        self.first_files = {}  # size -> (file key, path) of the only file of that size, not hashed yet
+        self.hashed_keys = {}  # size -> {sha256: content key} of the hashed files
+        self.hits = self.spill_hits = self.misses = 0
+        self._lock = threading.Lock()  # accessed from prefetch threads too
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get_content_key(self, file_name):
+        """
+        Return the key of the file content. Files are hashed only when several files have the same size.
+        """
+        stat = os.stat(file_name)
+        size = stat.st_size
+        file_key = (stat.st_dev, stat.st_ino, size, stat.st_mtime_ns)
+        with self._lock:
+            content_key = self.content_keys.get(file_key)
+            if content_key is not None:
+                return content_key
+            if size not in self.first_files and size not in self.hashed_keys:
+                content_key = self.content_keys[file_key] = "_".join(map(str, file_key))
+                self.first_files[size] = (file_key, file_name)
+                return content_key
+            first = self.first_files.pop(size, None)
+        hashed = {}
+        if first is not None:  # the first file of this size is hashed now, if it has not been changed
+            first_key, first_name = first
+            try:
+                first_stat = os.stat(first_name)
+                if (first_stat.st_dev, first_stat.st_ino, first_stat.st_size, first_stat.st_mtime_ns) == first_key:
+                    hashed[hash_file(first_name)] = self.content_keys[first_key]
+            except OSError:
+                pass
+        sha256 = hash_file(file_name)
+        with self._lock:
+            keys = self.hashed_keys.setdefault(size, {})
+            for first_sha256, first_content_key in hashed.items():
+                keys.setdefault(first_sha256, first_content_key)
+            content_key = self.content_keys[file_key] = keys.setdefault(sha256, sha256)
+        return content_key
+
+    def read_fasta(self, file_name):
+        """
+        Same as seq_util.read_fasta, but served from the cache when the file content has been read before.
+        """
+        content_key = self.get_content_key(file_name)
+        with self._lock:
+            entry = self.entries.get(content_key)
+            if entry is not None:
+                self.entries.move_to_end(content_key)
+                self.hits += 1
+        if entry is not None:
+            return self._new_records(entry, file_name)
+        entry = self._load_spilled(content_key)
+        if entry is not None:
+            with self._lock:
+                self.spill_hits += 1
+            seq_records = self._new_records(entry, file_name)
+        else:
+            with self._lock:
+                self.misses += 1
+            records = get_record_tuples(self.loader(file_name))
+            scans = [{} for _ in records]
+            if any(is_mapped(seq) for _, seq, _, _ in records):  # only the scans are kept
+                entry = CacheEntry(None, scans, RECORD_OVERHEAD * len(records))
+            else:
+                entry = CacheEntry(records, scans, sum(len(seq) + RECORD_OVERHEAD for _, seq, _, _ in records))
+            seq_records = entry.new_records(records)
+        with self._lock:
+            self._insert(content_key, entry)
+        return seq_records
+
+    def _new_records(self, entry, file_name):
+        if entry.records is None:  # memory-mapped
+            return entry.new_records(get_record_tuples(self.loader(file_name)))
+        return entry.new_records()
+
+    def _insert(self, content_key, entry):
+        if entry.size > self.memory_budget:
+            return
+        if content_key in self.entries:
+            return
+        self.entries[content_key] = entry
+        self.used_bytes += entry.size
+        while self.used_bytes > self.memory_budget:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.used_bytes -= evicted.size
+            self._spill(evicted_key, evicted)
+
+    def _spill_file(self, content_key):
+        return os.path.join(self.spill_dir, f"{content_key}.pickle")
+
+    def _spill(self, content_key, entry):
+        if not self.spill_dir:
+            return
+        spill_file = self._spill_file(content_key)
+        tmp_file = spill_file + ".tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, spill_file)
+        except OSError as err:
+            logger.warning(f"Failed to spill the cache entry to {spill_file}: {err}")
+
+    def _load_spilled(self, content_key):
+        if not self.spill_dir:
+            return None
+        spill_file = self._spill_file(content_key)
+        if not os.path.exists(spill_file):
+            return None
+        try:
+            with open(spill_file, "rb") as f:
+                return pickle.load(f)
+        except Exception as err:
+            logger.warning(f"Failed to load the spilled cache entry {spill_file}: {err}")
+            return None
+
+    def report(self):
+        return {"hits": self.hits, "spill_hits": self.spill_hits, "misses": self.misses,
+                "entries": len(self.entries), "used_bytes": self.used_bytes}
@@ -0,0 +1,115 @@
+import datetime
+from dataclasses import dataclass, field
+
+# Conversion of sample sheet rows into dictionaries.
+# The two-row header (feature name, qualifier key) is compiled once into a plan of (column index, target),
+# and each row is then converted from a plain tuple of cell values.
+
+# targets of the columns
+SKIP = "skip"
+SEQUENCE = "sequence"
+SEQUENCE_ARRAY = "sequence_array"
+SOURCE = "source"
+SOURCE_DATE = "source_date"
+COMMENT = "comment"
+DBLINK_ARRAY = "dblink_array"
+FEATURE = "feature"
+
+
+def str2array(value: str) -> list[str]:
+    return [v.strip() for v in value.split(";")]
+
+
+def get_column_target(feature_name: str, qualifier_key: str) -> str:
+    if feature_name == "-":
+        return SKIP
+    elif feature_name == "_sequence":
+        if qualifier_key in ["seq_names", "seq_types", "seq_topologies"]:
+            return SEQUENCE_ARRAY
+        return SEQUENCE
+    elif feature_name == "source":
+        if qualifier_key == "collection_date":
+            return SOURCE_DATE
+        return SOURCE
+    elif feature_name == "COMMENT":
+        return COMMENT
+    elif qualifier_key in ["biosample", "sequence read archive"]:
+        return DBLINK_ARRAY
+    else:
+        return FEATURE
+
+
+def dict_to_row(row_dict: dict) -> tuple[list[tuple[str, str]], tuple]:
+    """
+    Convert a row given as {feature name: {qualifier key: value}} (the two header rows of the sample sheet)
+    into (columns, tuple of cell values). Values are converted to strings, None to "".
+    The "_file_path" column is added as "" if missing.
+    """
+    cells = {("_", "_file_path"): ""}
+    for feature_name, qualifiers in row_dict.items():
+        if not isinstance(qualifiers, dict):
+            raise ValueError(f"Qualifiers of {feature_name} must be given as {{qualifier key: value}}")
+        for qualifier_key, value in qualifiers.items():
+            cells[(feature_name, qualifier_key)] = "" if value is None else str(value)
+    if not cells.get(("_", "_trad_submission_category")):
+        raise ValueError("_trad_submission_category is required")
+    return list(cells), tuple(cells.values())
+
+
+@dataclass
+class RowMapper:
+
+    columns: list[tuple[str, str]]
+    plan: list[tuple[int, str, str, str]] = field(default_factory=list)  # (column index, target, feature_name, qualifier_key)
+    file_path_index: int = -1
+    category_index: int = -1
+
+    @staticmethod
+    def compile(columns):
+        """
+        Compile the header (list of (feature_name, qualifier_key), e.g. DataFrame.columns) into a RowMapper
+        """
+        columns = [tuple(column) for column in columns]
+        plan = []
+        for index, (feature_name, qualifier_key) in enumerate(columns):
+            target = get_column_target(feature_name, qualifier_key)
+            if target != SKIP:
+                plan.append((index, target, feature_name, qualifier_key))
+        file_path_index = columns.index(("_", "_file_path"))
+        category_index = columns.index(("_", "_trad_submission_category"))
+        return RowMapper(columns, plan, file_path_index, category_index)
+
+    def file_path(self, values):
+        return values[self.file_path_index]
+
+    def category(self, values):
+        return values[self.category_index]
+
+    def apply(self, values, json_data):
+        """
+        Add cell values of a row (tuple) to json_data and return dict_sequence and dict_source.
+        """
+        dict_sequence = {}
+        dict_source = {}
+        for index, target, feature_name, qualifier_key in self.plan:
+            value = values[index]
+            if not value:
+                continue
+            if target == FEATURE:
+                json_data.setdefault(feature_name, {})[qualifier_key] = value
+            elif target == SOURCE:
+                dict_source[qualifier_key] = value
+            elif target == SOURCE_DATE:
+                if isinstance(value, datetime.datetime):  # including pandas.Timestamp
+                    value = value.strftime("%Y-%m-%d")
+                dict_source[qualifier_key] = value
+            elif target == SEQUENCE:
+                dict_sequence[qualifier_key] = value
+            elif target == SEQUENCE_ARRAY:
+                dict_sequence[qualifier_key] = str2array(value)
+            elif target == COMMENT:
+                json_data.setdefault(feature_name, []).append({qualifier_key: str2array(value)})
+            elif target == DBLINK_ARRAY:
+                value = value.replace(";", ",")
+                json_data.setdefault(feature_name, {})[qualifier_key] = [v.strip() for v in value.split(",")]
+        return dict_sequence, dict_source
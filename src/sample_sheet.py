@@ -0,0 +1,90 @@
+import csv
+
+# Loading of the sample sheet (TSV or Excel).
+# Both return (columns, rows), where columns is the list of (feature_name, qualifier_key) from the two-row header
+# and rows is an iterable of tuples of cell values (empty cells are "").
+# TSV files are read with the csv module, so pandas is not imported for them. Only the header is read first;
+# rows are streamed from the file each time they are iterated, so memory does not grow with the sheet size.
+
+# strings regarded as missing values by pandas.read_csv. They are converted to "" as fillna("") did.
+NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+}
+
+
+def parse_header(header_rows):
+    """
+    Combine the two header rows into (feature_name, qualifier_key). Blank cells and duplicate columns are named as in pandas.
+    """
+    num_columns = max(len(header_row) for header_row in header_rows)
+    columns = []
+    for i in range(num_columns):
+        names = []
+        for level, header_row in enumerate(header_rows):
+            name = header_row[i] if i < len(header_row) else ""
+            names.append(name or f"Unnamed: {i}_level_{level}")
+        columns.append(tuple(names))
+    return dedup_columns(columns)
+
+
+def dedup_columns(columns):
+    """
+    Rename duplicate columns by appending ".1", ".2", ... to the qualifier key, as pandas.read_csv does
+    (e.g. the second (COMMENT, line) becomes (COMMENT, line.1)).
+    """
+    counts = {}
+    deduped = []
+    for column in columns:
+        count = counts.get(column, 0)
+        while count > 0:
+            counts[column] = count + 1
+            column = column[:-1] + (f"{column[-1]}.{count}",)
+            count = counts.get(column, 0)
+        deduped.append(column)
+        counts[column] = count + 1
+    return deduped
+
+
+def iter_tsv_lines(f):
+    reader = csv.reader(f, delimiter="\t")
+    for line in reader:
+        if line:  # blank lines are skipped
+            yield reader.line_num, line
+
+
+class TsvRows:
+    """
+    Rows of a TSV sample sheet. The file is read line by line each time the rows are iterated.
+    """
+
+    def __init__(self, file_name, num_columns):
+        self.file_name = file_name
+        self.num_columns = num_columns
+
+    def __iter__(self):
+        num_columns = self.num_columns
+        with open(self.file_name, newline="", encoding="utf-8-sig") as f:
+            lines = iter_tsv_lines(f)
+            next(lines, None), next(lines, None)  # header
+            for line_num, line in lines:
+                if len(line) > num_columns:
+                    raise ValueError(f"Expected {num_columns} fields in line {line_num}, saw {len(line)}")
+                values = ["" if value in NA_VALUES else value for value in line]
+                values += [""] * (num_columns - len(values))
+                yield tuple(values)
+
+
+def read_tsv_sheet(file_name):
+    with open(file_name, newline="", encoding="utf-8-sig") as f:
+        lines = iter_tsv_lines(f)
+        header_rows = [line for _, line in [next(lines, (0, [])), next(lines, (0, []))]]
+    columns = parse_header(header_rows)
+    return columns, TsvRows(file_name, len(columns))
+
+
+def read_excel_sheet(file_name, sheet_name):
+    import pandas as pd
+    df = pd.read_excel(file_name, sheet_name=sheet_name, header=[0,1], dtype=str)
+    df.fillna("", inplace=True)
+    return list(df.columns), list(df.itertuples(index=False, name=None))
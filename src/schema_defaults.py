@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+
+# Compiled default values of the JSON schema.
+# The "default" values of the schema are collected once into an immutable tree of
+# (property, has default, default value, kind, children), and then applied to json data with dict.setdefault.
+# The result is the same as the former jsonschema validator hook (set_default_validator), including the order of keys:
+#   - properties are visited in the order of the schema, and "default" is set if the property is missing
+#   - properties of type "object" are created ({}) and their properties are visited
+#   - for the "REFERENCE" array, [{}] is created if missing, and the item properties are visited for each item
+#   - a "$ref" of a property is resolved by merging the property subschema into the referred definition (and removing "$ref").
+#     Merged definitions are accumulated as in the hook, which updated the definitions of the schema in place.
+#     Here they are kept in the tree and the schema is not modified. resolve_schema returns the schema with the merged
+#     definitions, i.e. the schema that was validated after the hook was applied. (The hook did not merge the item properties
+#     of an empty REFERENCE array. They only add annotations such as "title" to the definitions, which do not affect validation.)
+
+OBJECT = "object"
+ARRAY = "array"  # the REFERENCE array
+
+
+def copy_json(value):
+    """
+    Copy a JSON value (dicts and lists are copied recursively)
+    """
+    if isinstance(value, dict):
+        return {key: copy_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_json(item) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class DefaultTree:
+
+    properties: tuple = ()  # ((property, has_default, default, kind, children), ...), children is a tuple of the same form
+    definitions: dict = field(default_factory=dict)  # definition name -> merged definition
+
+    @staticmethod
+    def compile(schema):
+        """
+        Compile the (reduced) schema into a DefaultTree. The schema is not modified.
+        """
+        definitions = schema.get("definitions", {})
+        merged = {}
+
+        def resolve(subschema):
+            if "$ref" not in subschema:
+                return subschema
+            name = subschema["$ref"].split("/")[-1]
+            definition = {**merged.get(name, definitions[name]), **subschema}
+            del definition["$ref"]
+            merged[name] = definition
+            return definition
+
+        def compile_properties(properties):
+            nodes = []
+            for property, subschema in properties.items():
+                subschema = resolve(subschema)
+                has_default = "default" in subschema
+                default = copy_json(subschema["default"]) if has_default else None
+                kind, children = None, ()
+                if subschema.get("type") == "object":
+                    kind, children = OBJECT, compile_properties(subschema.get("properties", {}))
+                elif subschema.get("type") == "array" and property == "REFERENCE":
+                    items = subschema.get("items", {})
+                    kind = ARRAY
+                    children = compile_properties(items.get("properties", {})) if items.get("type") == "object" else None
+                nodes.append((property, has_default, default, kind, children))
+            return tuple(nodes)
+
+        properties = compile_properties(schema.get("properties", {}))
+        return DefaultTree(properties, merged)
+
+    def apply(self, json_data):
+        """
+        Set the default values to json_data in place and return it. Default values are copied.
+        """
+        _apply_properties(self.properties, json_data)
+        return json_data
+
+    def resolve_schema(self, schema):
+        """
+        Return a new schema with the merged definitions (the schema is not modified)
+        """
+        if not self.definitions:
+            return schema
+        return {**schema, "definitions": {**schema.get("definitions", {}), **self.definitions}}
+
+
+def _apply_properties(nodes, instance):
+    for property, has_default, default, kind, children in nodes:
+        if has_default and property not in instance:
+            instance.setdefault(property, copy_json(default))
+        if kind == OBJECT:
+            _apply_properties(children, instance.setdefault(property, {}))
+        elif kind == ARRAY:
+            items = instance.setdefault(property, [{}])
+            if children is not None:
+                for item in items:
+                    _apply_properties(children, item)
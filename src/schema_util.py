@@ -1,18 +1,152 @@
-import urllib.request
 import json
-from jsonschema import validate, ValidationError, Draft202012Validator, validators
 import os
+import copy
+import pickle
+import hashlib
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from .schema_defaults import DefaultTree
+# urllib and jsonschema are imported when they are used, to keep the startup fast
 jsaon_schema_url = "https://raw.githubusercontent.com/ddbj/template_generator_api/main/src/dev_schemas/MSS_COMMON_template.json"
 script_dir = os.path.dirname(os.path.abspath(__file__))
 schema_local_filepath = os.path.join(script_dir, "MSS_COMMON_template.json")
 
+# Schema cache. The local schema file is parsed and reduced for each submission category (get_subschema_for_category),
+# and the default values of each category are compiled (see schema_defaults.py) once, and saved as {sha256 of the schema file}.v{SCHEMA_CACHE_VERSION}.pickle in schema_cache_dir.
+# Later runs load the cache matching the content of the schema file. The schema is not downloaded implicitly;
+# run `MSSmaker.py --refresh_schema` to update the local schema file (with a timeout and an optional checksum).
+schema_cache_dir = os.path.join(script_dir, "schema_cache")
+SCHEMA_CACHE_VERSION = 2  # increment when the contents of SchemaCache change
+SCHEMA_TIMEOUT = 30  # seconds
+CATEGORIES = ["GNM", "MAG", "WGS", "MAG-WGS"]
+VALIDATION_MEMO_SIZE = 1024  # errors memoized by RowValidator (per category), in LRU order
+
 logger = logging.getLogger(__name__)
 
+# loaded SchemaCache for each schema file, and for each schema object (by id) returned from get_local_schema
+_loaded_schema_caches = {}
+_schema_caches_by_id = {}
+
+
+@dataclass
+class SchemaCache:
+    schema_hash: str
+    schema: dict
+    subschemas: dict = field(default_factory=dict)  # category -> reduced schema
+    defaults: dict = field(default_factory=dict)  # category -> DefaultTree of the reduced schema
+    version: int = SCHEMA_CACHE_VERSION
+
+    @staticmethod
+    def build(schema, schema_hash):
+        subschemas, defaults = {}, {}
+        for category in CATEGORIES:
+            subschema = copy.deepcopy(schema)
+            get_subschema_for_category(subschema, category)
+            subschemas[category] = subschema
+            defaults[category] = DefaultTree.compile(subschema)
+        return SchemaCache(schema_hash, schema, subschemas, defaults)
+
 
-def get_remote_schema():
+def load_schema_cache(schema_file=schema_local_filepath, cache_dir=schema_cache_dir) -> SchemaCache:
+    """
+    Return the SchemaCache of the schema file, loaded from cache_dir or built (and saved) if there is no valid cache.
+    """
+    if not os.path.exists(schema_file):
+        raise FileNotFoundError(f"{schema_file} is not found. Run MSSmaker.py --refresh_schema to download it.")
+    with open(schema_file, "rb") as f:
+        data = f.read()
+    schema_hash = hashlib.sha256(data).hexdigest()
+    cache = _loaded_schema_caches.get(schema_file)
+    if cache is not None and cache.schema_hash == schema_hash:
+        return cache
+    cache_file = os.path.join(cache_dir, f"{schema_hash}.v{SCHEMA_CACHE_VERSION}.pickle")
+    cache = None
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                cache = pickle.load(f)
+            if cache.version != SCHEMA_CACHE_VERSION or cache.schema_hash != schema_hash:
+                cache = None
+        except Exception as err:
+            logger.warning(f"Failed to load the schema cache {cache_file}: {err}")
+            cache = None
+    if cache is None:
+        cache = SchemaCache.build(json.loads(data), schema_hash)
+        save_schema_cache(cache, cache_file)
+    _loaded_schema_caches[schema_file] = cache
+    _schema_caches_by_id[id(cache.schema)] = cache
+    return cache
+
+
+def save_schema_cache(cache, cache_file):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
     try:
-        with urllib.request.urlopen(jsaon_schema_url) as response:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as err:  # e.g. read-only installation. The cache is built again next time.
+        logger.debug(f"Failed to save the schema cache {cache_file}: {err}")
+
+
+def _get_schema_cache(schema, category):
+    cache = _schema_caches_by_id.get(id(schema))
+    if cache is not None and cache.schema is schema and category in cache.subschemas:
+        return cache
+    return None
+
+
+def get_category_schema(schema, category):
+    """
+    Return the schema reduced for the category. The reduced schema in the cache is used for the schema
+    returned from get_local_schema. The returned object may be shared and must not be modified.
+    """
+    cache = _get_schema_cache(schema, category)
+    if cache is not None:
+        return cache.subschemas[category]
+    schema = copy.deepcopy(schema)
+    get_subschema_for_category(schema, category)
+    return schema
+
+
+def get_category_defaults(schema, category, category_schema=None) -> DefaultTree:
+    """
+    Return the DefaultTree of the schema reduced for the category (compiled in the cache for the local schema)
+    """
+    cache = _get_schema_cache(schema, category)
+    if cache is not None:
+        return cache.defaults[category]
+    return DefaultTree.compile(category_schema or get_category_schema(schema, category))
+
+
+def refresh_schema(url=jsaon_schema_url, expected_sha256=None, schema_file=schema_local_filepath, cache_dir=schema_cache_dir, timeout=SCHEMA_TIMEOUT) -> SchemaCache:
+    """
+    Download the schema, check its checksum (if expected_sha256 is given) and contents, then replace the local
+    schema file and build its cache. The local file is not changed if any check fails.
+    """
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read()
+    schema_hash = hashlib.sha256(data).hexdigest()
+    if expected_sha256 and schema_hash != expected_sha256.lower():
+        raise ValueError(f"Checksum mismatch of the downloaded schema: expected {expected_sha256}, got {schema_hash}")
+    schema = json.loads(data.decode("utf-8"))
+    if not isinstance(schema, dict) or "allOf" not in schema:
+        raise ValueError(f"The downloaded file is not an MSS schema: {url}")
+    tmp_file = f"{schema_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file, schema_file)
+    print(f"The schema has been downloaded to {schema_file} (sha256: {schema_hash})")
+    _loaded_schema_caches.pop(schema_file, None)
+    return load_schema_cache(schema_file, cache_dir)
+
+
+def get_remote_schema(timeout=SCHEMA_TIMEOUT):
+    import urllib.request
+    try:
+        with urllib.request.urlopen(jsaon_schema_url, timeout=timeout) as response:
             data = response.read()
             json_data = json.loads(data.decode())
             return json_data    
@@ -22,19 +156,20 @@ def get_remote_schema():
         print(f"Unexpected Error while retrieving a remote file: {err}")
 
 def get_local_schema():
-    if not os.path.exists(schema_local_filepath):
-        download_json_file(jsaon_schema_url, schema_local_filepath)
+    """
+    Return the local schema, loaded through the schema cache. The returned object is shared and must not be modified.
+    """
     try:
-        with open(schema_local_filepath, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        return load_schema_cache().schema
     except Exception as err:
         print(f"Error while loading a json file: {err}")
         return None
 
-def download_json_file(url, local_filename):
+def download_json_file(url, local_filename, timeout=SCHEMA_TIMEOUT):
+    import urllib.request
     try:
         # URLからデータを取得する
-        with urllib.request.urlopen(url) as response:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
             data = response.read().decode('utf-8')
 
         # JSONデータをファイルに保存する
@@ -57,6 +192,7 @@ def load_json_file(filename):
     
 
 def validate_json(json_data, schema):
+    from jsonschema import validate, ValidationError
     try:
         validate(instance=json_data, schema=schema)
         print("JSONデータはスキーマに従っています。")
@@ -66,6 +202,52 @@ def validate_json(json_data, schema):
         print(f"バリデーション中にエラーが発生しました: {err}")
 
 
+class RowValidator:
+    """
+    Validator compiled once from the (reduced) schema and reused for all rows.
+    Top-level properties are validated one by one and their errors are memoized by value, because most of them
+    (SUBMITTER, REFERENCE, ...) come from the common metadata and are the same in all rows.
+    Only the last memo_size values are kept, so that per-row values (sample names etc.) do not grow the memo.
+    """
+
+    def __init__(self, schema, memo_size=VALIDATION_MEMO_SIZE):
+        from jsonschema import Draft202012Validator
+        self.validator = Draft202012Validator(schema)
+        self.properties = schema.get("properties", {})
+        # keywords other than properties (type, required, ...) are checked for each row
+        self.root_validator = self.validator.evolve(schema={key: value for key, value in schema.items() if key != "properties"})
+        self.memo_size = memo_size
+        self._errors = OrderedDict()  # (property, serialized value) -> errors, in LRU order
+
+    def iter_errors(self, json_data):
+        yield from self.root_validator.iter_errors(json_data)
+        if not isinstance(json_data, dict):
+            return
+        for key, value in json_data.items():
+            subschema = self.properties.get(key)
+            if subschema is None:
+                continue
+            cache_key = (key, json.dumps(value, sort_keys=True, default=str))
+            errors = self._errors.get(cache_key)
+            if errors is None:
+                errors = self._errors[cache_key] = list(self.validator.descend(value, subschema, path=key, schema_path=key))
+                if len(self._errors) > self.memo_size:
+                    self._errors.popitem(last=False)
+            else:
+                self._errors.move_to_end(cache_key)
+            yield from errors
+
+    def get_error_messages(self, json_data) -> list[str]:
+        """
+        Return all validation errors as "path: message"
+        """
+        messages = []
+        for error in self.iter_errors(json_data):
+            path = "/".join(str(p) for p in error.absolute_path) or "(root)"
+            messages.append(f"{path}: {error.message}")
+        return messages
+
+
 def get_subschema_for_category(schema, category):
     """
     create json schema for the given category
@@ -84,52 +266,12 @@ def get_subschema_for_category(schema, category):
     schema.setdefault("required",[]).extend(required)
 
 
-def set_default_validator(validator_class):
-    # json schema のデフォルの値を設定する
-    # see: https://stackoverflow.com/questions/41290777/trying-to-make-json-schema-validator-in-python-to-set-default-values
-    validate_properties = validator_class.VALIDATORS["properties"]
-
-    def set_defaults(validator, properties, instance, schema):
-        for property, subschema in properties.items():
-            # print(f"{property=}, {subschema=}, {instance=}")
-            # if len(subschema) == 1 and "$ref" in subschema:
-            # print(f"{property=}\n{subschema=}\n{instance=}\n======")
-            if "$ref" in subschema:
-                # if "definitions" not in schema:
-                #     print("----")
-                #     print(schema)
-                #     exit()
-                definitions = schema.get("definitions", {})
-                definition_subchema = definitions[subschema["$ref"].split("/")[-1]]
-                definition_subchema.update(subschema)
-                subschema = definition_subchema
-                del subschema["$ref"]
-                # print("ref", subschema)
-            if "default" in subschema:
-                # print("-"*10)
-                # print(f"Default value found: {subschema['default']}, {instance=}")
-                instance.setdefault(property, subschema["default"])
-                # print(f"Applied default, {instance=}")
-                # print("-"*10)
-            if subschema.get("type") == "object":
-                set_defaults(validator, subschema.get("properties", {}), instance.setdefault(property, {}), schema)
-            elif subschema.get("type") == "array" and property == "REFERENCE":
-                for item in instance.setdefault(property, [{}]):
-                    if subschema.get("items", {}).get("type") == "object":
-                        set_defaults(validator, subschema.get("items", {}).get("properties", {}), item, schema)
-
-        # for error in validate_properties(
-        #     validator, properties, instance, schema,
-        # ):
-        #     yield error
-
-    return validators.extend(
-        validator_class, {"properties" : set_defaults},
-    )
-
 def set_default_to_json(json_data, schema):
-    DefaultValidatingValidator = set_default_validator(Draft202012Validator)
-    DefaultValidatingValidator(schema).validate(json_data)
+    """
+    json schema のデフォルトの値を設定する
+    The default values are compiled from the schema (see schema_defaults.py). The schema is not modified.
+    """
+    DefaultTree.compile(schema).apply(json_data)
 
 
 
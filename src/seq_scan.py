@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+from functools import cache
+from .seq_util import iter_seq_chunks
+
+# Single-pass scan of a sequence.
+# Each chunk of the raw sequence bytes is classified once with a lookup table (N, G/C, other IUPAC base, illegal),
+# and the N runs (for assembly_gap), base counts (length, GC, N) and positions of illegal characters
+# (not IUPAC nucleotide codes, which DDBJ rejects) are all collected from the classified chunk.
+
+# classes of the characters
+ILLEGAL = 0
+N_BASE = 1
+GC_BASE = 2
+OTHER_BASE = 3
+
+IUPAC_BASES = "ACGTMRWSYKVHDBN"  # nucleotide codes accepted in the sequence (case-insensitive)
+MAX_ILLEGAL_POSITIONS = 10  # positions of illegal characters kept for reporting (all of them are counted)
+
+
+@cache
+def get_class_table():
+    """
+    lookup table from a byte to its class. numpy is imported here rather than at module load, to keep the startup fast
+    """
+    import numpy as np
+    table = np.full(256, ILLEGAL, dtype=np.uint8)
+    for base in IUPAC_BASES:
+        base_class = N_BASE if base == "N" else GC_BASE if base in "GC" else OTHER_BASE
+        table[[ord(base), ord(base.lower())]] = base_class
+    return table
+
+
+@dataclass
+class SeqScan:
+    length: int = 0
+    gc_count: int = 0
+    n_count: int = 0
+    n_runs: list[tuple[int, int]] = field(default_factory=list)  # (start, end), 0-based and end exclusive
+    illegal_count: int = 0
+    illegal_positions: list[int] = field(default_factory=list)  # 0-based, first MAX_ILLEGAL_POSITIONS only
+    illegal_chars: str = ""
+
+    @property
+    def gc_content(self):
+        """
+        GC content excluding N
+        """
+        num_bases = self.length - self.n_count
+        return self.gc_count / num_bases if num_bases else 0.0
+
+
+def scan_sequence(seq, min_gap_length=1):
+    """
+    Scan the sequence once and return SeqScan. N runs shorter than min_gap_length are not included.
+    seq can be Bio.Seq, str, bytes-like or MappedSequence. It is read chunk by chunk without a lowercase
+    or whole-sequence copy. Runs spanning chunk boundaries are merged.
+    """
+    import numpy as np
+    table = get_class_table()
+    result = SeqScan()
+    illegal_chars = set()
+    runs = []
+    pending = None  # run reaching the end of the previous chunk
+    offset = 0
+    for chunk in iter_seq_chunks(seq):
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        if not len(data):
+            continue
+        classes = np.take(table, data)
+        mask = classes == N_BASE
+        num_n = int(np.count_nonzero(mask))
+        result.n_count += num_n
+        result.gc_count += int(np.count_nonzero(classes == GC_BASE))
+        if np.count_nonzero(classes == ILLEGAL):
+            positions = np.flatnonzero(classes == ILLEGAL)
+            result.illegal_count += len(positions)
+            illegal_chars.update(np.unique(data[positions]).tolist())
+            num_kept = MAX_ILLEGAL_POSITIONS - len(result.illegal_positions)
+            result.illegal_positions += (positions[:num_kept] + offset).tolist()
+
+        chunk_end = offset + len(data)
+        if num_n:
+            edges = (np.flatnonzero(mask[1:] != mask[:-1]) + (offset + 1)).tolist()
+            if mask[0]:
+                edges.insert(0, offset)
+            if mask[-1]:
+                edges.append(chunk_end)
+            chunk_runs = list(zip(edges[0::2], edges[1::2]))
+        else:
+            chunk_runs = []
+        if pending:
+            if chunk_runs and chunk_runs[0][0] == offset:
+                chunk_runs[0] = (pending[0], chunk_runs[0][1])
+            else:
+                runs.append(pending)
+            pending = None
+        if chunk_runs and chunk_runs[-1][1] == chunk_end:
+            pending = chunk_runs.pop()
+        runs.extend(chunk_runs)
+        offset = chunk_end
+    if pending:
+        runs.append(pending)
+    result.length = offset
+    result.n_runs = [(start, end) for start, end in runs if end - start >= min_gap_length]
+    result.illegal_chars = "".join(sorted(map(chr, illegal_chars)))
+    return result
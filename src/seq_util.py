@@ -1,21 +1,172 @@
-import gzip
-from Bio import SeqIO
 import re
+from .fasta_mmap import is_mappable, read_mapped_fasta, NO_HEADER_ERROR
+from .compressed_io import open_input
+
+def parse_fasta(handle, read_size=1 << 20):
+    """
+    Parse FASTA from a handle opened in binary mode and yield SeqRecords.
+    The records are the same as those from SeqIO.parse(handle, "fasta"), and ValueError is raised
+    in the same way if the input does not start with a header line.
+    The input is processed in large blocks and only header lines are located, instead of iterating over every line.
+    """
+    title = None
+    parts = []
+    carry = b"\n"  # the first line is regarded as preceded by a line break
+    eof = False
+    first = True
+    while not eof:
+        block = handle.read(read_size)
+        eof = not block
+        if first and block:
+            if block[:1] != b">":
+                raise ValueError(NO_HEADER_ERROR)
+            first = False
+        data = carry + (block or b"\n")
+        pos = 0
+        while (marker := data.find(b"\n>", pos)) >= 0:
+            header_end = data.find(b"\n", marker + 2)
+            if header_end < 0:  # header line continues to the next block
+                break
+            if title is not None:
+                parts.append(data[pos:marker])
+                yield _create_seq_record(title, parts)
+            title = data[marker + 2:header_end].rstrip().decode()
+            parts = []
+            pos = header_end
+        if marker >= 0:
+            end = marker
+        elif data.endswith(b"\n"):
+            end = len(data) - 1  # may be followed by ">" in the next block
+        else:
+            end = len(data)
+        if title is not None:
+            parts.append(data[pos:end])
+        carry = data[end:]
+    if title is not None:
+        yield _create_seq_record(title, parts)
+
+
+def _create_seq_record(title, parts):
+    from Bio.Seq import Seq  # Biopython is imported only when compressed FASTA is parsed
+    from Bio.SeqRecord import SeqRecord
+    words = title.split(None, 1)
+    seq_id = words[0] if words else ""
+    sequence = b"".join(parts).translate(None, b" \t\r\n")
+    return SeqRecord(Seq(sequence), id=seq_id, name=seq_id, description=title)
+
+
+def to_seq_record(seq_record):
+    """
+    Return a Bio.SeqRecord with the same id, sequence, name and description as the SeqRecord-like object
+    (MappedRecord, CachedRecord...). The sequence of a memory-mapped record is read into memory.
+    """
+    from Bio.Seq import Seq
+    from Bio.SeqRecord import SeqRecord
+    if isinstance(seq_record, SeqRecord):
+        return seq_record
+    seq = seq_record.seq
+    if not isinstance(seq, Seq):
+        seq = Seq(bytes(seq) if hasattr(seq, "iter_chunks") else seq)  # MappedSequence
+    return SeqRecord(seq, id=seq_record.id, name=getattr(seq_record, "name", "<unknown name>"),
+                     description=getattr(seq_record, "description", "<unknown description>"))
+
+
+def iter_fasta(file_name, use_mmap=True):
+    """
+    Yield SeqRecords one by one. Only the current record is kept in memory (streaming mode)
+    Uncompressed files are memory-mapped and MappedRecords are returned instead of SeqRecords.
+    Compressed files (gzip, bgzip, xz, zstd, bz2) are decompressed on a background thread.
+    """
+    if use_mmap and is_mappable(file_name):
+        yield from read_mapped_fasta(file_name)
+        return
+    with open_input(file_name) as handle:
+        yield from parse_fasta(handle)
+
+
+def read_fasta(file_name, use_mmap=True):
+    if use_mmap and is_mappable(file_name):
+        return read_mapped_fasta(file_name)
+    return list(iter_fasta(file_name, use_mmap=False))
+
+
+def read_fasta_ids(file_name):
+    """
+    Return sequence IDs by scanning the header lines only.
+    Used in streaming mode to know the number of sequences before the records are processed.
+    """
+    if is_mappable(file_name):
+        return [seq_record.id for seq_record in read_mapped_fasta(file_name)]
+    seq_ids = []
+    with open_input(file_name) as handle:
+        for line in handle:
+            if not seq_ids and line[:1] != b">":
+                raise ValueError(NO_HEADER_ERROR)
+            if line[:1] == b">":
+                title = line[1:].decode().split(None, 1)
+                seq_ids.append(title[0] if title else "")  # same as the ID assigned by Bio.SeqIO
+    return seq_ids
 
-def read_fasta(file_name):
-    if file_name.endswith(".gz"):
-        return list(SeqIO.parse(gzip.open(file_name, "rt"), "fasta"))
-    else:
-        return list(SeqIO.parse(file_name, "fasta"))
 
+SEQ_CHUNK_SIZE = 1 << 22  # 4 MB. Sequences are scanned and written by chunks of this size.
 
-def check_number_of_seqs(seq_list,  dict_sequence):
+
+def iter_buffer_chunks(seq, chunk_size=SEQ_CHUNK_SIZE):
+    """
+    Split a bytes-like object into memoryview chunks (no copy)
+    """
+    buf = memoryview(seq).cast("B")
+    for offset in range(0, len(buf), chunk_size):
+        yield buf[offset:offset + chunk_size]
+
+
+def iter_seq_chunks(seq):
+    """
+    Return sequence chunks for Seq, str, bytes-like objects, or sequences providing iter_chunks() (e.g. MappedSequence)
+    """
+    if hasattr(seq, "iter_chunks"):
+        return seq.iter_chunks()
+    if isinstance(seq, str):
+        seq = seq.encode()
+    elif not isinstance(seq, (bytes, bytearray, memoryview)):
+        seq = bytes(seq)  # Bio.Seq shares its buffer
+    return iter_buffer_chunks(seq)
+
+
+def check_number_of_seqs(seq_ids,  dict_sequence):
     seq_names, seq_types, seq_topologies = dict_sequence.setdefault("seq_names", []), dict_sequence.setdefault("seq_types", []), dict_sequence.setdefault("seq_topologies", [])
     if not seq_names:
-        for seq in seq_list:
-            seq_names.append(seq.id)
+        seq_names.extend(seq_ids)
         
-    if not (len(seq_list) == len(seq_names) == len(seq_types) == len(seq_topologies)):
+    if not (len(seq_ids) == len(seq_names) == len(seq_types) == len(seq_topologies)):
+        raise AssertionError("The number of sequences is not consistent.")
+
+
+def iter_checked_seqs(seq_records, dict_sequence):
+    """
+    Same check as check_number_of_seqs for records read one by one (streaming mode), so that a compressed file
+    is not decompressed twice to know its IDs in advance. seq_names are filled from the record IDs as they are read.
+    The lists of dict_sequence are checked when called, and the number of records when an extra record is read
+    or the records end early.
+    """
+    seq_names, seq_types, seq_topologies = dict_sequence.setdefault("seq_names", []), dict_sequence.setdefault("seq_types", []), dict_sequence.setdefault("seq_topologies", [])
+    fill_names = not seq_names
+    num_seqs = len(seq_types)
+    if len(seq_topologies) != num_seqs or (not fill_names and len(seq_names) != num_seqs):
+        raise AssertionError("The number of sequences is not consistent.")
+    return _iter_checked_seqs(seq_records, num_seqs, seq_names if fill_names else None)
+
+
+def _iter_checked_seqs(seq_records, num_seqs, seq_names=None):
+    count = 0
+    for seq_record in seq_records:
+        count += 1
+        if count > num_seqs:
+            raise AssertionError("The number of sequences is not consistent.")
+        if seq_names is not None:
+            seq_names.append(seq_record.id)
+        yield seq_record
+    if count != num_seqs:
         raise AssertionError("The number of sequences is not consistent.")
 
 # constant values for assembly_gap feature
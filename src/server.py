@@ -0,0 +1,176 @@
+import json
+import logging
+import itertools
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .batch_runner import init_worker, process_row, _worker_context
+from .main_mss_maker import validate_row
+from .row_mapper import RowMapper, dict_to_row
+from .schema_util import CATEGORIES
+
+# Conversion server (MSSserver.py).
+# Worker processes load the common metadata, schema, per-category templates and validators and the lazily imported
+# modules (numpy, jsonschema, Biopython) once at startup, and then convert one row per request.
+#   POST /convert  {"row": {feature name: {qualifier key: value}}, "fasta": FASTA path, "out_dir": ..., "hold_date": ...}
+#                  "row" has the same columns as the sample sheet (e.g. {"_": {"_trad_submission_category": "WGS"}, "source": {...}}).
+#                  "fasta" is used as the "_file_path" column, and "out_dir" and "hold_date" override the server options.
+#                  Returns the output files, per-stage metrics and captured messages as JSON.
+#   GET  /health   Returns the numbers of workers and pending requests.
+# At most max_pending requests are accepted at a time (processed by `jobs` workers); others get 503.
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    pass
+
+
+def init_server_worker(**worker_kwargs):
+    """
+    init_worker, then import modules and compile the templates and validators of all categories in advance
+    """
+    init_worker(**worker_kwargs)
+    ctx = _worker_context
+    from .seq_scan import get_class_table
+    get_class_table()  # numpy
+    for category in CATEGORIES:
+        ctx["templates"].validator(category)  # jsonschema
+    try:
+        import Bio.SeqRecord  # for compressed FASTA files
+    except ImportError:
+        pass
+
+
+def convert_row(index, row, mapper, out_dir=None, hold_date=None):
+    """
+    Validate and convert one row in a worker process. Returns (RowResult or None, validation errors).
+    """
+    ctx = _worker_context
+    try:
+        errors = validate_row(row, ctx["base_json_data"], ctx["base_schema"], mapper, templates=ctx["templates"])
+    except Exception as err:
+        errors = [f"{type(err).__name__}: {err}"]
+    if errors:
+        return None, errors
+    return process_row(index, row, mapper=mapper, out_dir=out_dir, hold_date=hold_date), []
+
+
+def parse_request(data):
+    """
+    Convert the request body into (columns, row). Cell values are converted to strings as in the sample sheet.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("row"), dict):
+        raise RequestError('"row" must be an object of {feature name: {qualifier key: value}}')
+    row = data["row"]
+    if data.get("fasta"):
+        row = {**row, "_": {**row.get("_", {}), "_file_path": data["fasta"]}}
+    columns, values = dict_to_row(row)
+    if not values[columns.index(("_", "_file_path"))]:
+        raise RequestError('"fasta" is required')
+    return columns, values
+
+
+class MSSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, worker_kwargs, jobs=1, max_pending=None):
+        super().__init__(address, MSSRequestHandler)
+        self.executor = ProcessPoolExecutor(max_workers=jobs, initializer=partial(init_server_worker, **worker_kwargs))
+        self.jobs = jobs
+        self.max_pending = max_pending or jobs * 2
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.pending = 0
+        self.counter = itertools.count()
+        self.mappers = {}  # RowMapper for each set of columns
+        self._lock = threading.Lock()
+        # start the workers now, so that the first request does not wait for the imports
+        for future in [self.executor.submit(int) for _ in range(jobs)]:
+            future.result()
+
+    def get_mapper(self, columns):
+        key = tuple(columns)
+        with self._lock:
+            mapper = self.mappers.get(key)
+            if mapper is None:
+                mapper = self.mappers[key] = RowMapper.compile(columns)
+        return mapper
+
+    def convert(self, data):
+        """
+        Returns (HTTP status, response body)
+        """
+        columns, row = parse_request(data)
+        mapper = self.get_mapper(columns)
+        if not self.slots.acquire(blocking=False):
+            return 503, {"status": "busy", "error": f"{self.max_pending} requests are already pending"}
+        try:
+            with self._lock:
+                self.pending += 1
+                index = next(self.counter)
+            future = self.executor.submit(convert_row, index, row, mapper, data.get("out_dir"), data.get("hold_date"))
+            result, errors = future.result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self.slots.release()
+        file_path = mapper.file_path(row)
+        if errors:
+            return 422, {"index": index, "file_path": file_path, "status": "invalid", "errors": errors}
+        body = {"index": index, "file_path": file_path, "status": "succeeded" if result.ok else "failed",
+                "outputs": result.outputs, "metrics": result.metrics, "log": result.log}
+        if not result.ok:
+            body["error"] = result.error
+        return 200 if result.ok else 500, body
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(cancel_futures=True)
+
+
+class MSSRequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"Not found: {self.path}"})
+            return
+        self.send_json(200, {"status": "ok", "jobs": self.server.jobs, "pending": self.server.pending,
+                             "max_pending": self.server.max_pending})
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self.send_json(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"null")
+            status, body = self.server.convert(data)
+        except (RequestError, ValueError) as err:  # including JSON decode errors
+            status, body = 400, {"status": "bad_request", "error": str(err)}
+        except Exception as err:  # e.g. worker process killed
+            logger.exception("Failed to process the request")
+            status, body = 500, {"status": "failed", "error": f"{type(err).__name__}: {err}"}
+        self.send_json(status, body)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def serve(host, port, worker_kwargs, jobs=1, max_pending=None):
+    server = MSSServer((host, port), worker_kwargs, jobs, max_pending)
+    logger.info(f"Listening on http://{host}:{port} with {jobs} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,113 @@
+import os
+import json
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from .mss_writer import MSSWriter, LINE_WIDTH
+from .metrics import NULL_METRICS
+
+# Sharded output (--shard_size / --shard_records options of MSSmaker.py).
+# Instead of one {prefix}.ann and {prefix}.fa, the entries are split into {prefix}.part001.ann/.fa, {prefix}.part002.ann/.fa, ...
+# Each shard is a complete MSS file pair: it starts with the same COMMON rows (and the source feature of WGS),
+# followed by the entries of the shard. Entry names are not changed, so the numbering of seq_prefix continues across shards.
+# A shard is closed when the estimated size of its sequence file or its number of entries reaches the limit
+# (a single entry larger than the size limit makes a shard by itself).
+# Shards are written on a thread pool while the next shard is collected. At most `writers` shards are pending,
+# so in streaming mode the memory use is bounded by about writers * shard size.
+# {prefix}.shards.json lists the shards with their files, numbers of entries and bases, and the first and last entry names.
+
+SHARD_WRITERS = 4
+
+
+@dataclass
+class ShardInfo:
+    index: int
+    files: list[str]
+    entries: int = 0
+    bases: int = 0
+    first_entry: str|None = None
+    last_entry: str|None = None
+    file_sizes: dict = field(default_factory=dict)
+
+
+def get_shard_prefix(prefix, index):
+    return f"{prefix}.part{str(index).zfill(3)}"
+
+
+def estimate_fasta_size(seq_id, seq_length, width=LINE_WIDTH):
+    """
+    Size of the entry in the sequence file: header, lines of width bases and "//"
+    """
+    return len(seq_id) + 2 + seq_length + -(-seq_length // width) + 3
+
+
+def write_shard(out_dir, prefix, index, common_annot, entries, gzip_threads=None):
+    """
+    Write one shard (list of (annotation rows, SeqRecord)) and return its ShardInfo
+    """
+    with MSSWriter(out_dir, get_shard_prefix(prefix, index), gzip_threads=gzip_threads) as writer:
+        writer.write_annotation(common_annot)
+        for entry_annot, seq_record in entries:
+            writer.write_annotation(entry_annot)
+            writer.write_sequence(seq_record.id, seq_record.seq)
+    info = ShardInfo(index, [os.path.basename(output_file) for output_file in writer.output_files])
+    info.entries = len(entries)
+    info.bases = sum(len(seq_record.seq) for _, seq_record in entries)
+    if entries:
+        info.first_entry, info.last_entry = entries[0][1].id, entries[-1][1].id
+    info.file_sizes = {os.path.basename(output_file): os.path.getsize(output_file) for output_file in writer.output_files}
+    return info
+
+
+def iter_shards(entries, shard_bytes=None, shard_records=None):
+    """
+    Group (annotation rows, SeqRecord) pairs into lists by the size and number limits
+    """
+    shard, shard_size = [], 0
+    for entry_annot, seq_record in entries:
+        size = estimate_fasta_size(seq_record.id, len(seq_record.seq))
+        if shard and ((shard_bytes and shard_size + size > shard_bytes) or (shard_records and len(shard) >= shard_records)):
+            yield shard
+            shard, shard_size = [], 0
+        shard.append((entry_annot, seq_record))
+        shard_size += size
+    yield shard  # the last shard (an empty one if there are no entries)
+
+
+def output_shards(out_dir, prefix, annot, entries, shard_bytes=None, shard_records=None, gzip_threads=None,
+                  writers=SHARD_WRITERS, metrics=NULL_METRICS):
+    """
+    Write the entries into shards and the shard index, and return the paths of all output files.
+    annot is the list of COMMON rows written at the top of every shard.
+    Only submitting and waiting for the shards is measured as the output stage, as entries may be read while iterating.
+    """
+    os.makedirs(out_dir, exist_ok=True)  # before the writer threads start
+    shards = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=writers, thread_name_prefix="shard") as executor:
+        for index, shard in enumerate(iter_shards(entries, shard_bytes, shard_records), 1):
+            with metrics.stage("output"):
+                if len(pending) >= writers:
+                    shards.append(pending.popleft().result())
+                pending.append(executor.submit(write_shard, out_dir, prefix, index, annot, shard, gzip_threads))
+            del shard
+        with metrics.stage("output"):
+            while pending:
+                shards.append(pending.popleft().result())
+            index_file = write_shard_index(out_dir, prefix, shards, shard_bytes, shard_records)
+    output_files = [os.path.join(out_dir, file_name) for info in shards for file_name in info.files]
+    return output_files + [index_file]
+
+
+def write_shard_index(out_dir, prefix, shards, shard_bytes=None, shard_records=None):
+    index_file = os.path.join(out_dir, f"{prefix}.shards.json")
+    data = {
+        "prefix": prefix,
+        "shard_bytes": shard_bytes,
+        "shard_records": shard_records,
+        "entries": sum(info.entries for info in shards),
+        "shards": [asdict(info) for info in shards],
+    }
+    with open(index_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return index_file
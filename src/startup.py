@@ -0,0 +1,62 @@
+import sys
+import time
+import atexit
+import builtins
+from importlib.util import resolve_name
+
+# Measurement of the startup cost (--import_time option of MSSmaker.py).
+# Imports are timed by wrapping builtins.__import__, and reported in the same format as `python -X importtime`.
+# Modules imported lazily while processing (pandas, Biopython, numpy, jsonschema...) are also included.
+# The report is printed at exit, also when the run ends with sys.exit (--validate_only, --strict) or an error.
+
+_start_time = time.perf_counter()
+_records = []  # (depth, module name, self time [us], cumulative time [us])
+_stack = []  # children's cumulative time of the imports in progress
+_ready_time = None
+
+
+def install_import_timer():
+    """
+    Time all following imports and report them at exit
+    """
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = resolve_name("." * level + name, (globals or {}).get("__package__")) if level else name
+        if module_name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        depth = len(_stack)
+        _stack.append(0)
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = int((time.perf_counter() - start) * 1e6)
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += cumulative
+            _records.append((depth, module_name, cumulative - children, cumulative))
+
+    builtins.__import__ = timed_import
+    atexit.register(report_import_time)
+
+
+def mark_ready():
+    """
+    Record the time when the startup is finished (just before the first row is processed)
+    """
+    global _ready_time
+    _ready_time = time.perf_counter()
+
+
+def report_import_time(file=None):
+    """
+    Print timed imports, the startup time and the total elapsed time since this module was loaded.
+    """
+    file = file or sys.stderr
+    print("import time: self [us] | cumulative | imported package", file=file)
+    for depth, name, self_time, cumulative in _records:
+        print(f"import time: {self_time:>9} | {cumulative:>10} | {'  ' * depth}{name}", file=file)
+    if _ready_time is not None:
+        print(f"startup time: {(_ready_time - _start_time) * 1000:.1f} ms", file=file)
+    print(f"total time: {(time.perf_counter() - _start_time) * 1000:.1f} ms", file=file)
@@ -0,0 +1,35 @@
+import os
+import pytest
+from src.main_mss_maker import CategoryTemplates, validate_row
+from src.row_mapper import RowMapper, dict_to_row
+from src.schema_util import load_json_file, get_local_schema
+
+COMMON_JSON = os.path.join(os.path.dirname(__file__), "..", "example", "common_example.json")
+
+
+@pytest.fixture
+def templates():
+    return CategoryTemplates(load_json_file(COMMON_JSON), get_local_schema())
+
+
+def to_row(category):
+    columns, row = dict_to_row({"_": {"_trad_submission_category": category, "_file_path": "x.fa"}})
+    return row, RowMapper.compile(columns)
+
+
+def test_templates_are_cached_by_category(templates):
+    json_data, schema = templates.template("WGS")
+    assert json_data["_trad_submission_category"] == "WGS"
+    assert templates.template("WGS") is templates.template("WGS")
+    assert templates.validator("WGS") is templates.validator("WGS")
+    assert list(templates.templates) == ["WGS"]
+
+
+def test_unknown_category_is_rejected(templates):
+    with pytest.raises(ValueError):
+        templates.template("XYZ")
+    assert templates.templates == {}
+    row, mapper = to_row("XYZ")
+    errors = validate_row(row, templates.base_json_data, templates.base_schema, mapper, check_file=False, templates=templates)
+    assert len(errors) == 1 and "XYZ" in errors[0]
+    assert templates.templates == {}
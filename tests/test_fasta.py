@@ -0,0 +1,55 @@
+import gzip
+import pytest
+from Bio import SeqIO
+from src.seq_util import read_fasta, read_fasta_ids, iter_fasta, iter_checked_seqs
+
+FASTA = ">seq1 first sequence\nACGTNNNN\nNNNNACGT\n>seq2\nacgt\n"
+
+
+def write_fasta(path, text, compressed=False):
+    if compressed:
+        with gzip.open(path, "wt") as f:
+            f.write(text)
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_read_fasta_same_as_seqio(tmp_path, compressed):
+    file_name = write_fasta(tmp_path / "a.fa", FASTA, compressed)
+    records = read_fasta(file_name)
+    expected = list(SeqIO.parse(write_fasta(tmp_path / "b.fa", FASTA), "fasta"))
+    assert [(r.id, r.description, str(r.seq)) for r in records] == \
+        [(r.id, r.description, str(r.seq)) for r in expected]
+    assert read_fasta_ids(file_name) == ["seq1", "seq2"]
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+@pytest.mark.parametrize("text", ["comment\n" + FASTA, "\n" + FASTA])
+def test_text_before_first_header(tmp_path, compressed, text):
+    file_name = write_fasta(tmp_path / "a.fa", text, compressed)
+    with pytest.raises(ValueError):
+        list(SeqIO.parse(write_fasta(tmp_path / "b.fa", text), "fasta"))
+    with pytest.raises(ValueError):
+        read_fasta(file_name)
+    with pytest.raises(ValueError):
+        read_fasta_ids(file_name)
+
+
+@pytest.mark.parametrize("seq_names, seq_types, ok", [
+    ([], ["c", "p"], True),
+    (["chr", "pA"], ["c", "p"], True),
+    ([], ["c"], False),
+    ([], ["c", "p", "p"], False),
+])
+def test_iter_checked_seqs(tmp_path, seq_names, seq_types, ok):
+    file_name = write_fasta(tmp_path / "a.fa.gz", FASTA, compressed=True)
+    dict_sequence = {"seq_names": list(seq_names), "seq_types": seq_types, "seq_topologies": ["c"] * len(seq_types)}
+    records = iter_checked_seqs(iter_fasta(file_name), dict_sequence)
+    if ok:
+        assert [r.id for r in records] == ["seq1", "seq2"]
+        assert dict_sequence["seq_names"] == (seq_names or ["seq1", "seq2"])
+    else:
+        with pytest.raises(AssertionError):
+            list(records)
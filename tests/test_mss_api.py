@@ -0,0 +1,43 @@
+import os
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from src.mss_api import MSSConverter
+from src.gap_annotator import GapAnnotator
+from src.main_mss_maker import create_mss
+from src.metrics import RowMetrics
+
+COMMON_JSON = os.path.join(os.path.dirname(__file__), "..", "example", "common_example.json")
+ROW = {"_": {"_trad_submission_category": "WGS"}, "DBLINK": {"project": "PRJDB99999", "biosample": "SAMD999998"},
+       "source": {"organism": "Clostridium zea", "strain": "CSC2"}}
+FASTA = ">a\nACGTNNNNNNNNNNNNACGT\n>b\nGGCC\n"
+
+
+def write_fasta(path, compressed=False):
+    if compressed:
+        import gzip
+        with gzip.open(path, "wt") as f:
+            f.write(FASTA)
+    else:
+        path.write_text(FASTA)
+    return str(path)
+
+
+def test_collect_returns_seq_records(tmp_path):
+    converter = MSSConverter(COMMON_JSON, GapAnnotator())
+    results = []
+    for name, compressed in [("plain.fa", False), ("compressed.fa.gz", True)]:
+        _, seq_records = converter.build(ROW, fasta=write_fasta(tmp_path / name, compressed)).collect()
+        assert all(isinstance(seq_record, SeqRecord) for seq_record in seq_records)
+        results.append([(seq_record.id, str(seq_record.seq)) for seq_record in seq_records])
+    assert results[0] == results[1]
+    assert [seq for _, seq in results[0]] == ["ACGTNNNNNNNNNNNNACGT", "GGCC"]
+
+
+def test_create_with_preloaded_records(tmp_path):
+    converter = MSSConverter(COMMON_JSON, GapAnnotator())
+    records = [SeqRecord(Seq("ACGT"), id="a")]
+    row, mapper = converter.to_row(ROW, fasta="not_a_file.fa")
+    metrics = RowMetrics()
+    outputs = create_mss(row, converter.base_json_data, converter.base_schema, str(tmp_path), converter.gap_annotator,
+                         mapper=mapper, metrics=metrics, preloaded_records=records)
+    assert all(os.path.exists(output) for output in outputs)
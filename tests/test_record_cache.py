@@ -0,0 +1,81 @@
+import gc
+import gzip
+import os
+import pytest
+from src.record_cache import RecordCache, RECORD_OVERHEAD
+from src.seq_scan import scan_sequence
+
+SEQUENCE = "ACGT" * 250 + "N" * 20 + "ACGT" * 250
+
+
+def write_fasta(path, seq_id, compressed=False):
+    text = f">{seq_id}\n{SEQUENCE}\n"
+    if compressed:
+        with gzip.open(path, "wt") as f:
+            f.write(text)
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+def count_open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_entries_are_evicted(tmp_path):
+    entry_size = len(SEQUENCE) + RECORD_OVERHEAD
+    cache = RecordCache(entry_size * 3)
+    for i in range(10):
+        records = cache.read_fasta(write_fasta(tmp_path / f"{i}.fa.gz", f"seq{i}", compressed=True))
+        assert str(records[0].seq) == SEQUENCE
+        assert cache.used_bytes <= cache.memory_budget
+    assert len(cache.entries) == 3
+    assert cache.misses == 10
+    cache.read_fasta(str(tmp_path / "9.fa.gz"))
+    assert cache.hits == 1
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires /proc")
+def test_mapped_records_are_not_kept(tmp_path):
+    file_names = [write_fasta(tmp_path / f"{i}.fa", f"seq{i}") for i in range(50)]
+    cache = RecordCache(1 << 30)
+    gc.collect()
+    open_files = count_open_files()
+    for file_name in file_names:
+        records = cache.read_fasta(file_name)
+        assert bytes(records[0].seq) == SEQUENCE.encode()
+        del records
+    gc.collect()
+    # the mappings (and their file descriptors) are released with the records
+    assert count_open_files() == open_files
+    assert all(entry.records is None for entry in cache.entries.values())
+
+
+def test_scans_of_mapped_records_are_shared(tmp_path):
+    file_name = write_fasta(tmp_path / "a.fa", "seq")
+    cache = RecordCache(1 << 30)
+    records = cache.read_fasta(file_name)
+    records[0].scans[10] = scan_sequence(records[0].seq, 10)
+    records = cache.read_fasta(file_name)
+    assert cache.hits == 1
+    assert records[0].scans[10].n_runs == [(1000, 1020)]
+    assert bytes(records[0].seq) == SEQUENCE.encode()
+
+
+def test_files_are_hashed_only_for_the_same_size(tmp_path, monkeypatch):
+    import src.record_cache
+    hashed = []
+    hash_file = src.record_cache.hash_file
+    monkeypatch.setattr(src.record_cache, "hash_file", lambda file_name: hashed.append(file_name) or hash_file(file_name))
+    cache = RecordCache(1 << 20)
+    first = write_fasta(tmp_path / "a.fa.gz", "seq0", compressed=True)
+    cache.read_fasta(first)
+    cache.read_fasta(first)
+    assert hashed == []
+    copy = tmp_path / "copy.fa.gz"
+    copy.write_bytes(open(first, "rb").read())
+    cache.read_fasta(str(copy))
+    assert sorted(hashed) == sorted([first, str(copy)])
+    assert cache.report()["misses"] == 1 and cache.report()["hits"] == 2
+    other = write_fasta(tmp_path / "b.fa.gz", "seq1", compressed=True)
+    assert cache.get_content_key(other) != cache.get_content_key(first)
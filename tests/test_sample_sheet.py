@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+from src.sample_sheet import read_tsv_sheet
+
+HEADERS = [
+    "_\t_\tCOMMENT\tCOMMENT\n_trad_submission_category\t_file_path\tline\tline\n",
+    "_\t_\tCOMMENT\tCOMMENT\tCOMMENT\n_trad_submission_category\t_file_path\tline\tline\tline.1\n",
+    "_\t_\t\tCOMMENT\n_trad_submission_category\t_file_path\t\tline\n",
+]
+
+
+@pytest.mark.parametrize("header", HEADERS)
+def test_columns_same_as_pandas(tmp_path, header):
+    file_name = tmp_path / "sheet.tsv"
+    num_columns = header.split("\n")[0].count("\t") + 1
+    file_name.write_text(header + "\t".join(["WGS", "a.fa"] + ["x"] * (num_columns - 2)) + "\n")
+    columns, rows = read_tsv_sheet(file_name)
+    df = pd.read_csv(file_name, sep="\t", header=[0, 1], dtype=str)
+    assert columns == list(df.columns)
+    assert len(set(columns)) == len(columns)
+    assert list(rows) == list(df.itertuples(index=False, name=None))